@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Benchmark: batched Whisper decoding throughput
+#
+# Splits every recording into 30-second windows, then decodes all windows
+# with model.transcribe one at a time and with model.decode at several batch
+# sizes. Reports throughput in audio-seconds per wall-second and the word
+# error rate of each batched run against the sequential transcript, then
+# runs the cross-file pre-transcription used by jam.py end to end and checks
+# that it left a cached transcript for every file.
+#
+# Usage:
+#   python benchmarks/batched_decoding.py recording1.mp3 recording2.mp3 --batch-sizes 1 4 8 16
+
+import argparse
+import os
+import sys
+import tempfile
+import common
+
+# The end-to-end check must start from an empty transcript cache
+os.environ["ZONESIGHT_CACHE_DIR"] = tempfile.mkdtemp(prefix="zonesight-benchmark-")
+
+from audio import load_audio, duration_seconds, audio_fingerprint
+from models import get_whisper_model
+from transcription import split_windows, transcribe_segments, transcribe_windows_batched
+from vad import vad_chunks
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure batched Whisper decoding throughput")
+    parser.add_argument("audio", nargs="+", help="Audio files to transcribe")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Batch sizes to measure (default: 1 2 4 8 16)")
+    args = parser.parse_args()
+
+    model = get_whisper_model()
+    windows = []
+    audio_seconds = 0.0
+    for audio_file in args.audio:
+        audio = load_audio(audio_file)
+        audio_seconds += duration_seconds(audio)
+        chunks = vad_chunks(audio, 30)
+        windows.extend((audio_file, offset, samples) for offset, samples in split_windows(chunks))
+    print(f"{len(windows)} windows, {audio_seconds:.0f}s of audio from {len(args.audio)} files")
+
+    def sequential():
+        transcripts = {}
+        for source, offset, samples in windows:
+            transcripts.setdefault(source, []).extend(transcribe_segments(samples, offset, model))
+        return transcripts
+
+    reference, sequential_seconds = common.timed(sequential)
+
+    rows = [["transcribe", "-", f"{sequential_seconds:.1f}s", f"{audio_seconds / sequential_seconds:.1f}", "ref"]]
+    for batch_size in args.batch_sizes:
+        results, seconds = common.timed(transcribe_windows_batched, windows, batch_size, model)
+        wer = sum(common.word_error_rate(common.segments_text(reference[source]), common.segments_text(results[source]))
+                  for source in reference) / len(reference)
+        rows.append(["batched", batch_size, f"{seconds:.1f}s", f"{audio_seconds / seconds:.1f}", f"{wer:.3f}"])
+
+    common.print_table(["decoder", "batch", "wall", "audio-s/wall-s", "WER vs transcribe"], rows)
+
+    # jam.py --batch-size N with several files goes through pretranscribe_batch
+    from main import pretranscribe_batch, transcription_cache_key
+    from cache import cache_get
+    batch_size = max(args.batch_sizes)
+    _, seconds = common.timed(pretranscribe_batch, args.audio, batch_size)
+    missing = [audio_file for audio_file in args.audio
+               if cache_get("transcripts", transcription_cache_key(audio_fingerprint(load_audio(audio_file)), batch_size)) is None]
+    print(f"pretranscribe_batch: {len(args.audio) - len(missing)}/{len(args.audio)} files cached in {seconds:.1f}s")
+    if missing:
+        print(f"No cached transcript for: {', '.join(missing)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
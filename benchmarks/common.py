@@ -0,0 +1,50 @@
+# Shared helpers for the ZoneSight benchmark scripts
+# Run benchmarks from the repository root, e.g. python benchmarks/vad_chunking.py audio.mp3
+
+import os
+import sys
+import time
+
+# Make the modules in src/ importable without installing the project
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+def normalize_words(text):
+    """Lower-case a transcript and strip punctuation so that only words are compared"""
+    cleaned = "".join(c.lower() if c.isalnum() or c.isspace() or c == "'" else " " for c in text)
+    return cleaned.split()
+
+def word_error_rate(reference, hypothesis):
+    """Return the word error rate of hypothesis against reference (Levenshtein over words)"""
+    ref = normalize_words(reference)
+    hyp = normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1,
+                             current[j - 1] + 1,
+                             previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+def timed(func, *args, **kwargs):
+    """Call func and return (result, wall_seconds)"""
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+def segments_text(segments):
+    """Join Whisper segments into a single transcript string"""
+    return " ".join(segment["text"].strip() for segment in segments)
+
+def print_table(headers, rows):
+    """Print rows as a fixed-width text table"""
+    widths = [max([len(str(h))] + [len(str(row[i])) for row in rows]) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(v).ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# Benchmark: transcription engines side by side
+#
+# Transcribes the same recordings with every selected engine, using the
+# same VAD chunks and the configured model and precision, and reports load
+# time, wall time, real-time factor and the word error rate of each engine
+# against the first one.
+#
+# Usage:
+#   python benchmarks/engines.py recording.mp3 [--engines whisper faster-whisper]
+
+import argparse
+import common
+from audio import load_audio, duration_seconds
+from config import CHUNK_SECONDS
+from engines import ENGINES, get_engine
+from vad import vad_chunks
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare transcription engines")
+    parser.add_argument("audio", nargs="+", help="Audio files to transcribe")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES),
+                        help="Engines to compare; the first is the reference (default: all)")
+    args = parser.parse_args()
+
+    recordings = []
+    audio_seconds = 0.0
+    for audio_file in args.audio:
+        audio = load_audio(audio_file)
+        audio_seconds += duration_seconds(audio)
+        recordings.append(vad_chunks(audio, CHUNK_SECONDS))
+
+    transcripts = {}
+    rows = []
+    for name in args.engines:
+        engine = get_engine(name)
+        _, load_seconds = common.timed(engine.load)
+
+        def transcribe_all():
+            return [common.segments_text([segment for offset, samples in chunks
+                                          for segment in engine.transcribe(samples, offset)])
+                    for chunks in recordings]
+
+        transcripts[name], seconds = common.timed(transcribe_all)
+        reference = transcripts[args.engines[0]]
+        wer = sum(common.word_error_rate(ref, hyp) for ref, hyp in zip(reference, transcripts[name])) / len(reference)
+        rows.append([name, f"{load_seconds:.1f}s", f"{seconds:.1f}s", f"{seconds / audio_seconds:.3f}",
+                     "ref" if name == args.engines[0] else f"{wer:.3f}"])
+
+    print(f"{audio_seconds:.0f}s of audio from {len(args.audio)} files")
+    common.print_table(["engine", "load", "wall", "RTF", "WER vs ref"], rows)
+
+if __name__ == "__main__":
+    main()
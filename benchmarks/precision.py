@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Benchmark: Whisper precision modes on CPU
+#
+# Loads the Whisper model at each precision in a fresh process (so memory
+# numbers are not polluted by earlier runs), transcribes the given
+# recordings and reports load time, weight size, resident memory growth,
+# transcription wall time, speedup and transcript drift (WER against fp32).
+# The first int8 run also writes the quantized model cache; run twice to see
+# the cached load time.
+#
+# Usage:
+#   python benchmarks/precision.py recording.mp3 [--precisions fp32 int8 bf16]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import common
+
+def run_single(audio_files):
+    """Measure the configured WHISPER_PRECISION in this process and print the result as JSON"""
+    import time
+    from audio import load_audio, duration_seconds
+    from models import get_whisper_model, model_stats, resolve_precision
+    from transcription import transcribe_segments
+
+    model = get_whisper_model()
+    stats = model_stats()[0]
+    texts = []
+    audio_seconds = 0.0
+    start_time = time.perf_counter()
+    for audio_file in audio_files:
+        audio = load_audio(audio_file)
+        audio_seconds += duration_seconds(audio)
+        texts.append(common.segments_text(transcribe_segments(audio, model=model)))
+    print(json.dumps({
+        "precision": resolve_precision(),
+        "load_seconds": stats["load_seconds"],
+        "weights_mb": stats["weights_mb"],
+        "rss_delta_mb": stats["rss_delta_mb"],
+        "transcribe_seconds": time.perf_counter() - start_time,
+        "audio_seconds": audio_seconds,
+        "texts": texts
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Whisper precision modes on CPU")
+    parser.add_argument("audio", nargs="+", help="Audio files to transcribe")
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "int8", "bf16"],
+                        help="Precisions to measure; the first is the reference (default: fp32 int8 bf16)")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args.audio)
+        return
+
+    results = []
+    for precision in args.precisions:
+        print(f"Measuring {precision}...", file=sys.stderr)
+        env = {**os.environ, "WHISPER_DEVICE": "cpu", "WHISPER_PRECISION": precision}
+        output = subprocess.run([sys.executable, __file__, "--single", *args.audio],
+                                capture_output=True, text=True, check=True, env=env).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = results[0]
+    rows = []
+    for result in results:
+        drift = sum(common.word_error_rate(ref, hyp) for ref, hyp in zip(reference["texts"], result["texts"])) / len(result["texts"])
+        rows.append([
+            result["precision"],
+            f"{result['load_seconds']:.1f}s",
+            f"{result['weights_mb']:.0f} MB",
+            f"{result['rss_delta_mb']:.0f} MB",
+            f"{result['transcribe_seconds']:.1f}s",
+            f"{reference['transcribe_seconds'] / result['transcribe_seconds']:.2f}x",
+            "ref" if result is reference else f"{drift:.3f}"
+        ])
+    common.print_table(["precision", "load", "weights", "RSS growth", "transcribe", "speedup", "WER drift"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# Benchmark: fixed-size chunking vs voice-activity-detected chunking
+#
+# Transcribes each recording twice with the same warm Whisper model and
+# reports wall time, the share of audio sent to the decoder and the word
+# error rate. With --reference the WER is measured against a hand-made
+# transcript; otherwise the fixed-size transcript is used as the reference.
+#
+# With --synthetic, no model is needed: speech-like noise is mixed into
+# synthetic recordings (clean with long pauses, dense talk with short pauses,
+# and speech only 8 dB above classroom noise) and the speech VAD keeps is
+# compared against where the speech really is.
+#
+# Usage:
+#   python benchmarks/vad_chunking.py recording.mp3 [--reference recording.txt]
+#   python benchmarks/vad_chunking.py --synthetic
+
+import argparse
+import numpy as np
+import common
+from audio import load_audio, split_audio, duration_seconds, SAMPLE_RATE
+from config import CHUNK_SECONDS
+from vad import vad_chunks, speech_ratio
+
+# name: (noise RMS, speech level in dB over the noise, talk seconds, pause seconds)
+SYNTHETIC_CASES = {
+    "clean, long pauses": (0.001, 40.0, (3.0, 8.0), (1.5, 4.0)),
+    "dense talk, 0.4 s pauses": (0.003, 30.0, (6.0, 6.0), (0.4, 0.4)),
+    "speech 8 dB over noise": (0.03, 8.0, (4.0, 10.0), (0.8, 2.0)),
+}
+
+def speech_like(seconds, rng):
+    """Return noise with a syllable-rate envelope and word-level loudness changes"""
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    carrier = np.convolve(rng.standard_normal(n), np.ones(8) / 8, mode="same")
+    envelope = 0.5 + 0.5 * np.abs(np.sin(2 * np.pi * 2.0 * t + rng.uniform(0, 2 * np.pi)))
+    envelope *= np.exp(rng.normal(0, 0.3, size=n // 1600 + 1)).repeat(1600)[:n]
+    return carrier * envelope
+
+def synthetic_recording(noise_rms, snr_db, talk, pause, rng, seconds=300):
+    """Return (audio, speech mask) for one synthetic case"""
+    audio = rng.standard_normal(seconds * SAMPLE_RATE) * noise_rms
+    mask = np.zeros(len(audio), dtype=bool)
+    position = 0.0
+    while position < seconds - 1:
+        talk_seconds = rng.uniform(*talk)
+        start, end = int(position * SAMPLE_RATE), int(min(seconds, position + talk_seconds) * SAMPLE_RATE)
+        speech = speech_like((end - start) / SAMPLE_RATE, rng)
+        audio[start:end] += speech * noise_rms * 10 ** (snr_db / 20) / np.sqrt(np.mean(np.square(speech)))
+        mask[start:end] = True
+        position += talk_seconds + rng.uniform(*pause)
+    return audio.astype(np.float32), mask
+
+def synthetic(chunk_seconds, seed):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for name, (noise_rms, snr_db, talk, pause) in SYNTHETIC_CASES.items():
+        audio, mask = synthetic_recording(noise_rms, snr_db, talk, pause, rng)
+        chunks, seconds = common.timed(vad_chunks, audio, chunk_seconds)
+        kept = np.zeros(len(audio), dtype=bool)
+        for offset, samples in chunks:
+            start = int(round(offset * SAMPLE_RATE))
+            kept[start:start + len(samples)] = True
+        rows.append([name, f"{mask.mean():.0%}", f"{kept.mean():.0%}",
+                     f"{(kept & mask).sum() / max(1, mask.sum()):.1%}", len(chunks), f"{seconds:.2f}s"])
+    common.print_table(["case", "speech", "kept", "speech recall", "chunks", "wall"], rows)
+
+def transcribe_chunks(model, chunks):
+    from transcription import transcribe_segments
+    segments = []
+    for offset, samples in chunks:
+        segments.extend(transcribe_segments(samples, offset, model))
+    return segments
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed-size and VAD chunking")
+    parser.add_argument("audio", nargs="*", help="Audio files to transcribe")
+    parser.add_argument("--reference", help="Reference transcript (text file) for a single audio file")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS,
+                        help=f"Chunk length / VAD target duration (default: {CHUNK_SECONDS})")
+    parser.add_argument("--synthetic", action="store_true", help="Measure VAD on synthetic recordings instead")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for --synthetic")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        synthetic(args.chunk_seconds, args.seed)
+        return
+    if not args.audio:
+        parser.error("give audio files to transcribe, or --synthetic")
+
+    from models import get_whisper_model
+    model = get_whisper_model()
+    rows = []
+    for audio_file in args.audio:
+        audio = load_audio(audio_file)
+        fixed = split_audio(audio, args.chunk_seconds)
+        vad = vad_chunks(audio, args.chunk_seconds)
+
+        fixed_segments, fixed_seconds = common.timed(transcribe_chunks, model, fixed)
+        vad_segments, vad_seconds = common.timed(transcribe_chunks, model, vad)
+
+        if args.reference:
+            with open(args.reference, encoding="utf-8") as f:
+                reference = f.read()
+            fixed_wer = f"{common.word_error_rate(reference, common.segments_text(fixed_segments)):.3f}"
+        else:
+            reference = common.segments_text(fixed_segments)
+            fixed_wer = "ref"
+        vad_wer = common.word_error_rate(reference, common.segments_text(vad_segments))
+
+        rows.append([audio_file, f"{duration_seconds(audio):.0f}s", "fixed", len(fixed), "100%",
+                     f"{fixed_seconds:.1f}s", fixed_wer])
+        rows.append([audio_file, f"{duration_seconds(audio):.0f}s", "vad", len(vad),
+                     f"{speech_ratio(vad, audio):.0%}", f"{vad_seconds:.1f}s", f"{vad_wer:.3f}"])
+
+    common.print_table(["file", "duration", "chunking", "chunks", "decoded", "wall", "WER"], rows)
+
+if __name__ == "__main__":
+    main()
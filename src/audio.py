@@ -0,0 +1,164 @@
+# Audio loading and chunking for ZoneSight
+# Decodes input audio once into the 16 kHz mono float32 buffer that Whisper
+# consumes, and hands out zero-copy views of it for chunked transcription.
+
+import hashlib
+import subprocess
+import tempfile
+import numpy as np
+
+# Whisper models are trained on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# Streamed audio is read from ffmpeg in blocks of this many seconds
+BLOCK_SECONDS = 30
+
+def _ffmpeg_command(file_path, sample_rate):
+    return [
+        "ffmpeg", "-nostdin", "-nostats", "-loglevel", "error", "-threads", "0",
+        "-i", file_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+        "-"
+    ]
+
+def probe_duration(file_path):
+    """Return the container duration of a media file in seconds, or None if unknown"""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+           "-of", "default=noprint_wrappers=1:nokey=1", file_path]
+    try:
+        output = subprocess.run(cmd, capture_output=True, check=True, text=True).stdout
+        return float(output.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+def stream_audio(file_path, block_seconds=BLOCK_SECONDS, sample_rate=SAMPLE_RATE):
+    """
+    Decode a file through an ffmpeg pipe, yielding mono float32 blocks.
+
+    ffmpeg resamples to sample_rate and downmixes to mono, so no converted
+    file is ever written and only one block is held in memory at a time.
+
+    Args:
+        file_path: Path to any ffmpeg-readable audio (or video) file
+        block_seconds: Duration of each yielded block (the last one may be shorter)
+        sample_rate: Target sample rate in Hz
+
+    Yields:
+        1-D float32 NumPy arrays with samples in [-1, 1]
+    """
+    block_bytes = int(block_seconds * sample_rate) * 2
+    # stderr goes to a file rather than a pipe: ffmpeg would block once a damaged
+    # file's warnings filled the pipe, while we block waiting on stdout
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(_ffmpeg_command(file_path, sample_rate),
+                               stdout=subprocess.PIPE, stderr=stderr)
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                finished = True
+                break
+            if len(data) % 2:
+                data += process.stdout.read(1)
+            yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+    finally:
+        if not finished:
+            # The consumer stopped early; do not wait for ffmpeg to decode the rest
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+        try:
+            if finished and returncode != 0:
+                stderr.seek(0)
+                # The last errors are the ones that explain the failure
+                message = stderr.read().decode(errors='ignore').strip()[-2000:]
+                raise RuntimeError(f"Failed to decode audio {file_path}: {message}")
+        finally:
+            stderr.close()
+
+def load_audio(file_path, sample_rate=SAMPLE_RATE):
+    """
+    Decode any ffmpeg-readable file into a mono float32 array.
+
+    Blocks from stream_audio are copied into a buffer sized from the probed
+    duration, so peak memory is the decoded audio plus one block.
+
+    Args:
+        file_path: Path to the audio (or video) file
+        sample_rate: Target sample rate in Hz
+
+    Returns:
+        1-D float32 NumPy array with samples in [-1, 1]
+    """
+    duration = probe_duration(file_path)
+    capacity = int(duration * sample_rate) + sample_rate if duration else BLOCK_SECONDS * sample_rate
+    audio = np.empty(capacity, dtype=np.float32)
+    filled = 0
+    for block in stream_audio(file_path, sample_rate=sample_rate):
+        if filled + len(block) > len(audio):
+            grown = np.empty(max(2 * len(audio), filled + len(block)), dtype=np.float32)
+            grown[:filled] = audio[:filled]
+            audio = grown
+        audio[filled:filled + len(block)] = block
+        filled += len(block)
+    return audio[:filled]
+
+def pyannote_input(audio, sample_rate=SAMPLE_RATE):
+    """
+    Wrap a decoded buffer for a pyannote pipeline without copying or re-reading the file.
+
+    Returns:
+        {"waveform", "sample_rate"} mapping whose (1, n) float32 waveform tensor shares memory with audio
+    """
+    import torch
+    return {"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": sample_rate}
+
+def split_audio(audio, chunk_seconds, sample_rate=SAMPLE_RATE):
+    """
+    Split a decoded buffer into fixed-length chunks without copying.
+
+    Args:
+        audio: 1-D float32 array from load_audio
+        chunk_seconds: Maximum duration of each chunk
+        sample_rate: Sample rate of the buffer
+
+    Returns:
+        List of (start_seconds, samples) tuples, where samples is a view into audio
+    """
+    chunk_samples = max(1, int(chunk_seconds * sample_rate))
+    return [(start / sample_rate, audio[start:start + chunk_samples])
+            for start in range(0, len(audio), chunk_samples)]
+
+def duration_seconds(audio, sample_rate=SAMPLE_RATE):
+    """Return the duration of a decoded buffer in seconds"""
+    return len(audio) / sample_rate
+
+def audio_fingerprint(audio):
+    """Return a SHA-256 hex digest of the decoded samples (independent of container and codec)"""
+    return hashlib.sha256(memoryview(np.ascontiguousarray(audio))).hexdigest()
+
+def stream_fingerprint(file_path, sample_rate=SAMPLE_RATE, on_block=None):
+    """
+    Return the same digest as audio_fingerprint(load_audio(file_path)) without holding the whole file.
+
+    on_block, if given, is called with every decoded block, so that other
+    whole-recording statistics can be gathered in the same pass.
+    """
+    digest = hashlib.sha256()
+    for block in stream_audio(file_path, sample_rate=sample_rate):
+        digest.update(memoryview(block))
+        if on_block:
+            on_block(block)
+    return digest.hexdigest()
+
+def window_seconds_for(memory_limit_mb, sample_rate=SAMPLE_RATE):
+    """
+    Return the longest streaming window that fits a memory ceiling.
+
+    A window, the carried-over tail of the previous one and their
+    concatenation can be alive at the same time, so the budget is split
+    three ways. Model weights are not included in the ceiling.
+    """
+    bytes_per_second = sample_rate * np.dtype(np.float32).itemsize
+    return max(1.0, memory_limit_mb * 1024 * 1024 / (3 * bytes_per_second))
@@ -0,0 +1,194 @@
+# On-disk artifact cache for ZoneSight
+# Content-addressed JSON and NumPy entries grouped by namespace (e.g. "transcripts"),
+# with a shared size cap enforced by least-recently-used eviction, plus
+# per-job checkpoint directories that let interrupted transcriptions resume.
+#
+# Usage:
+#   python src/cache.py list [namespace]
+#   python src/cache.py clear [namespace]
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from config import CACHE_DIR, CACHE_MAX_MB
+
+_cache_lock = threading.Lock()
+
+def make_key(*parts):
+    """Return a stable SHA-256 key for any JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# JSON values and NumPy array bundles; anything else in a namespace (e.g. .tmp files) is ignored
+ENTRY_SUFFIXES = (".json", ".npz")
+
+def _entry_path(namespace, key, suffix=".json"):
+    return os.path.join(CACHE_DIR, namespace, f"{key}{suffix}")
+
+def cache_get(namespace, key):
+    """Return the cached value for key, or None on a miss"""
+    path = _entry_path(namespace, key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Touch the entry so eviction treats it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return value
+
+def _write_atomic(path, write, mode="w"):
+    # Write to a temporary file first so a crash never leaves a half-written entry
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _write_json_atomic(path, value):
+    _write_atomic(path, lambda f: json.dump(value, f))
+
+def cache_put(namespace, key, value):
+    """Store a JSON-serializable value atomically, then enforce the size cap"""
+    _write_json_atomic(_entry_path(namespace, key), value)
+    evict(CACHE_MAX_MB * 1024 * 1024)
+
+def array_get(namespace, key):
+    """Return the cached {name: ndarray} bundle for key, or None on a miss"""
+    import numpy as np
+    path = _entry_path(namespace, key, ".npz")
+    try:
+        with np.load(path, allow_pickle=False) as bundle:
+            arrays = {name: bundle[name] for name in bundle.files}
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return arrays
+
+def array_put(namespace, key, **arrays):
+    """Store named NumPy arrays as one compressed entry, then enforce the size cap"""
+    import numpy as np
+    _write_atomic(_entry_path(namespace, key, ".npz"), lambda f: np.savez_compressed(f, **arrays), mode="wb")
+    evict(CACHE_MAX_MB * 1024 * 1024)
+
+def job_dir(job_key):
+    """Return the checkpoint directory of one transcription job"""
+    return os.path.join(CACHE_DIR, "jobs", job_key)
+
+def _checkpoint_path(directory, offset):
+    return os.path.join(directory, f"chunk_{int(round(offset * 1000)):012d}.json")
+
+def load_checkpoint(directory, offset):
+    """Return the checkpointed segments of the chunk starting at offset, or None"""
+    try:
+        with open(_checkpoint_path(directory, offset), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(directory, offset, segments):
+    """Atomically record the segments of a finished chunk"""
+    _write_json_atomic(_checkpoint_path(directory, offset), segments)
+
+def clear_job(directory):
+    """Remove a job's checkpoints once its transcript is complete"""
+    shutil.rmtree(directory, ignore_errors=True)
+
+def list_entries(namespace=None):
+    """
+    List cache entries, most recently used first.
+
+    Returns:
+        List of {"namespace", "key", "path", "size", "last_used"} dictionaries
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    namespaces = [namespace] if namespace else sorted(os.listdir(CACHE_DIR))
+    entries = []
+    for ns in namespaces:
+        directory = os.path.join(CACHE_DIR, ns)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            suffix = os.path.splitext(name)[1]
+            if suffix not in ENTRY_SUFFIXES:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append({
+                "namespace": ns,
+                "key": name[:-len(suffix)],
+                "path": path,
+                "size": stat.st_size,
+                "last_used": stat.st_mtime
+            })
+    return sorted(entries, key=lambda entry: entry["last_used"], reverse=True)
+
+def evict(max_bytes):
+    """Delete least-recently-used entries until the cache fits in max_bytes"""
+    with _cache_lock:
+        entries = list_entries()
+        total = sum(entry["size"] for entry in entries)
+        evicted = 0
+        while entries and total > max_bytes:
+            entry = entries.pop()
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                continue
+            total -= entry["size"]
+            evicted += 1
+        return evicted
+
+def clear(namespace=None):
+    """Delete every entry (optionally only those in one namespace) and return the count"""
+    entries = list_entries(namespace)
+    for entry in entries:
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            pass
+    # Checkpoints of interrupted jobs are directories rather than entries
+    if namespace in (None, "jobs"):
+        clear_job(os.path.join(CACHE_DIR, "jobs"))
+    return len(entries)
+
+def main():
+    from datetime import datetime
+    parser = argparse.ArgumentParser(description="Inspect and clear the ZoneSight artifact cache")
+    parser.add_argument("command", choices=["list", "clear"], help="list entries or clear them")
+    parser.add_argument("namespace", nargs="?", help="Only act on one namespace, e.g. transcripts")
+    args = parser.parse_args()
+
+    if args.command == "clear":
+        print(f"Removed {clear(args.namespace)} cache entries from {CACHE_DIR}")
+        return
+
+    entries = list_entries(args.namespace)
+    for entry in entries:
+        last_used = datetime.fromtimestamp(entry["last_used"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{entry['namespace']:<14} {entry['key'][:16]}  {entry['size'] / 1024:>8.1f} KB  {last_used}")
+    total_mb = sum(entry["size"] for entry in entries) / (1024 * 1024)
+    print(f"{len(entries)} entries, {total_mb:.1f} MB of {CACHE_MAX_MB} MB in {CACHE_DIR}")
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,57 @@ OPENROUTER_URL = os.getenv('OPENROUTER_URL', 'https://openrouter.ai/api/v1/chat/
 OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'anthropic/claude-3.7-sonnet')
 SITE_URL = os.getenv('SITE_URL', 'https://your-site-url.com')
 SITE_NAME = os.getenv('SITE_NAME', 'Your Site Name')
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '10'))  # Seconds to establish the connection
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', '300'))  # Seconds to wait for the model's response
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', '16'))  # Keep-alive connections kept open per host
+LLM_GZIP_MIN_KB = int(os.getenv('LLM_GZIP_MIN_KB', '0'))  # Gzip request bodies at least this large (0 = never; needs provider support)
+LLM_PROMPT_CACHE = os.getenv('LLM_PROMPT_CACHE', 'true').lower() == 'true'  # Mark stable prompt prefixes for provider-side prompt caching
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))  # Speakers analyzed by the LLM at once
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '5'))  # Retries per request after a 429, 5xx, timeout or connection error
+LLM_BACKOFF_SECONDS = float(os.getenv('LLM_BACKOFF_SECONDS', '2'))  # First retry waits up to this long, doubling each time
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv('LLM_BACKOFF_MAX_SECONDS', '60'))  # Longest backoff between retries (Retry-After can exceed it)
+LLM_RETRY_BUDGET = int(os.getenv('LLM_RETRY_BUDGET', '50'))  # Retries shared by every request of a batch
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))  # Consecutive failures that pause all requests (0 = never)
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))  # Seconds requests stay paused before a probe request
+
+# Transcription configuration
+TRANSCRIPTION_ENGINE = os.getenv('TRANSCRIPTION_ENGINE', 'whisper')  # 'whisper' or 'faster-whisper' (CTranslate2)
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'medium')
+WHISPER_DEVICE = os.getenv('WHISPER_DEVICE')  # Unset picks cuda when available, else cpu
+WHISPER_PRECISION = os.getenv('WHISPER_PRECISION', 'fp32')
+CHUNK_SECONDS = float(os.getenv('CHUNK_SECONDS', '300'))  # Target length of each in-memory transcription chunk
+CHUNKING_MODE = os.getenv('CHUNKING_MODE', 'vad')  # 'vad' cuts on pauses and skips silence, 'fixed' cuts every CHUNK_SECONDS
+VAD_MIN_SPEECH_RATIO = float(os.getenv('VAD_MIN_SPEECH_RATIO', '0.05'))  # Fall back to fixed chunking when VAD keeps less than this
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '1'))  # Worker processes for chunk transcription (1 = in-process)
+TORCH_THREADS_PER_WORKER = int(os.getenv('TORCH_THREADS_PER_WORKER', '0')) or None  # Unset splits the cores evenly between workers
+WHISPER_BATCH_SIZE = int(os.getenv('WHISPER_BATCH_SIZE', '1'))  # 30-second windows decoded per batch (1 = sequential transcribe)
+MEMORY_LIMIT_MB = int(os.getenv('MEMORY_LIMIT_MB', '0'))  # Audio memory ceiling for streamed, window-by-window transcription (0 = decode whole file)
 
 # Diarization configuration
-DIARIZATION_MODEL = os.getenv('DIARIZATION_MODEL', 'pyannote/speaker-diarization')
+DIARIZATION_MODEL = os.getenv('DIARIZATION_MODEL', 'pyannote/speaker-diarization-3.1')
 HUGGING_FACE_TOKEN = os.getenv('HUGGING_FACE_TOKEN')
+DIARIZATION_MODEL_DIR = os.getenv('DIARIZATION_MODEL_DIR')  # Pinned local copy of the pipeline (a directory with config.yaml)
+DIARIZATION_OFFLINE = os.getenv('DIARIZATION_OFFLINE', 'false').lower() == 'true'  # Load only from DIARIZATION_MODEL_DIR, never the network
+SPEAKER_EMBEDDINGS = os.getenv('SPEAKER_EMBEDDINGS', 'true').lower() == 'true'  # Store per-turn embeddings from diarization for re-clustering (see src/embeddings.py)
+VOICE_STORE = os.getenv('VOICE_STORE', 'voices.npz')  # Enrolled voices of known students
+VOICE_MATCH_THRESHOLD = float(os.getenv('VOICE_MATCH_THRESHOLD', '0.6'))  # Minimum cosine similarity to name a speaker
+NUM_SPEAKERS = int(os.getenv('NUM_SPEAKERS', '0')) or None  # Known number of speakers (unset lets pyannote decide)
+MIN_SPEAKERS = int(os.getenv('MIN_SPEAKERS', '0')) or None  # Lower bound on the number of speakers
+MAX_SPEAKERS = int(os.getenv('MAX_SPEAKERS', '0')) or None  # Upper bound; curbs over-splitting into extra "speakers"
+DIARIZE_FIRST = os.getenv('DIARIZE_FIRST', 'false').lower() == 'true'  # Diarize before transcribing and only transcribe the selected speakers
+MIN_SPEAKER_SECONDS = float(os.getenv('MIN_SPEAKER_SECONDS', '0'))  # Diarize-first: skip speakers with less talk time than this
+EXCLUDE_SPEAKERS = [s.strip() for s in os.getenv('EXCLUDE_SPEAKERS', '').split(',') if s.strip()]  # Diarize-first: labels or enrolled names to skip
+CONCURRENT_DIARIZATION = os.getenv('CONCURRENT_DIARIZATION', 'false').lower() == 'true'  # Diarize in a thread while transcription runs
+DIARIZATION_THREADS = int(os.getenv('DIARIZATION_THREADS', '0')) or None  # Torch threads for concurrent diarization when TRANSCRIBE_WORKERS > 1 (unset = half the cores)
+
+# Worker daemon configuration (see src/daemon.py)
+DAEMON_SOCKET = os.getenv('ZONESIGHT_SOCKET', os.path.join('/tmp', f"zonesight-{os.getuid() if hasattr(os, 'getuid') else 'user'}.sock"))
+
+# Artifact cache configuration
+CACHE_DIR = os.getenv('ZONESIGHT_CACHE_DIR', 'cache')
+CACHE_MAX_MB = int(os.getenv('CACHE_MAX_MB', '512'))  # Least recently used entries are evicted beyond this size
+TRANSCRIPT_CACHE = os.getenv('TRANSCRIPT_CACHE', 'true').lower() == 'true'
+DIARIZATION_CACHE = os.getenv('DIARIZATION_CACHE', 'true').lower() == 'true'
+LLM_CACHE = os.getenv('LLM_CACHE', 'true').lower() == 'true'  # Reuse LLM responses for identical requests
+LLM_CACHE_TTL_HOURS = float(os.getenv('LLM_CACHE_TTL_HOURS', '720'))  # Cached LLM responses expire after this long (0 = never)
+TRANSCRIPT_CHECKPOINTS = os.getenv('TRANSCRIPT_CHECKPOINTS', 'true').lower() == 'true'  # Resume interrupted transcriptions chunk by chunk
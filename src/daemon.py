@@ -0,0 +1,264 @@
+# Worker daemon for ZoneSight
+# A long-running local process that keeps the Whisper and diarization models
+# warm and runs transcription jobs sent over a Unix socket, so that each JAM
+# invocation skips interpreter start-up, torch imports and model loading.
+#
+# Usage:
+#   python src/daemon.py start     # serve in the foreground (run under nohup or systemd)
+#   python src/daemon.py status    # queue depth and per-job latency
+#   python src/daemon.py stop
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from colorama import Fore, Style
+from config import (
+    DAEMON_SOCKET,
+    TRANSCRIBE_WORKERS,
+    TORCH_THREADS_PER_WORKER,
+    WHISPER_BATCH_SIZE,
+    MEMORY_LIMIT_MB,
+    TRANSCRIPTION_ENGINE,
+    CONCURRENT_DIARIZATION,
+    DIARIZE_FIRST
+)
+
+class DaemonUnavailable(Exception):
+    """Raised when no daemon is serving the socket, so the caller should work in-process"""
+
+def request(message, socket_path=DAEMON_SOCKET):
+    """
+    Send one JSON message to the daemon and return its JSON response.
+
+    Raises:
+        DaemonUnavailable: No daemon is listening, or it went away mid-request
+        RuntimeError: The daemon reported an error for this request
+    """
+    if not os.path.exists(socket_path):
+        raise DaemonUnavailable(f"No daemon socket at {socket_path}")
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+            with sock.makefile("r", encoding="utf-8") as reader:
+                line = reader.readline()
+    except (ConnectionError, FileNotFoundError) as e:
+        raise DaemonUnavailable(f"Could not reach daemon at {socket_path}: {e}") from e
+    if not line:
+        raise DaemonUnavailable("Daemon closed the connection before replying")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", "Unknown daemon error"))
+    return response
+
+def submit_transcription(audio_file, perform_diarization=True, workers=TRANSCRIBE_WORKERS,
+                         threads_per_worker=TORCH_THREADS_PER_WORKER, batch_size=WHISPER_BATCH_SIZE,
+                         memory_limit_mb=MEMORY_LIMIT_MB, engine=TRANSCRIPTION_ENGINE,
+                         concurrent_diarization=CONCURRENT_DIARIZATION, diarize_first=DIARIZE_FIRST,
+                         hints=None, socket_path=DAEMON_SOCKET):
+    """
+    Run transcribe_and_diarize for audio_file on the daemon.
+
+    Returns:
+        (speaker_transcripts, latency) where latency holds queued, processing
+        and total seconds for the job
+    """
+    response = request({
+        "op": "transcribe",
+        "audio_file": os.path.abspath(audio_file),
+        "cwd": os.getcwd(),
+        "perform_diarization": perform_diarization,
+        "workers": workers,
+        "threads_per_worker": threads_per_worker,
+        "batch_size": batch_size,
+        "memory_limit_mb": memory_limit_mb,
+        "engine": engine,
+        "concurrent_diarization": concurrent_diarization,
+        "diarize_first": diarize_first,
+        "hints": hints
+    }, socket_path)
+    return response["result"], response["latency"]
+
+class WorkerDaemon:
+    """Job queue and statistics shared by the socket handlers and the job thread"""
+
+    def __init__(self, preload_diarization=True):
+        self.preload_diarization = preload_diarization
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=100)
+        self.started_at = time.time()
+
+    def warm_up(self):
+        """Load the models before accepting the first job"""
+        from engines import get_engine
+        get_engine().load()
+        if self.preload_diarization:
+            from main import load_diarization_pipeline
+            from models import DiarizationUnavailable
+            try:
+                load_diarization_pipeline()
+            except DiarizationUnavailable:
+                print(f"{Fore.YELLOW}Diarization pipeline unavailable; diarization jobs will retry loading it{Style.RESET_ALL}")
+
+    def submit(self, job):
+        """Queue a job and block until the job thread has finished it"""
+        job["queued_at"] = time.time()
+        job["done"] = threading.Event()
+        self.jobs.put(job)
+        job["done"].wait()
+        return job["response"]
+
+    def run_jobs(self):
+        """Process queued jobs one at a time; the models are not shared between threads"""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            with self.lock:
+                self.active += 1
+            try:
+                job["response"] = self.process(job)
+            except Exception as e:
+                job["response"] = {"ok": False, "error": str(e)}
+            finally:
+                with self.lock:
+                    self.active -= 1
+                    if job["response"].get("ok") and job["response"].get("result") is not None:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                job["done"].set()
+
+    def process(self, job):
+        from main import transcribe_and_diarize
+        started_at = time.time()
+        # Relative paths (results/, cache/, sound files) resolve as they would in-process
+        os.chdir(job["cwd"])
+        print(f"{Fore.CYAN}Processing {job['audio_file']}...{Style.RESET_ALL}")
+        result = transcribe_and_diarize(
+            job["audio_file"],
+            job["perform_diarization"],
+            workers=job.get("workers") or TRANSCRIBE_WORKERS,
+            threads_per_worker=job.get("threads_per_worker"),
+            batch_size=job.get("batch_size") or WHISPER_BATCH_SIZE,
+            memory_limit_mb=job.get("memory_limit_mb", MEMORY_LIMIT_MB),
+            engine=job.get("engine") or TRANSCRIPTION_ENGINE,
+            concurrent_diarization=job.get("concurrent_diarization", CONCURRENT_DIARIZATION),
+            diarize_first=job.get("diarize_first", DIARIZE_FIRST),
+            hints=job.get("hints")
+        )
+        finished_at = time.time()
+        latency = {
+            "queued_seconds": started_at - job["queued_at"],
+            "processing_seconds": finished_at - started_at,
+            "total_seconds": finished_at - job["queued_at"]
+        }
+        with self.lock:
+            self.latencies.append(latency["processing_seconds"])
+        print(f"{Fore.GREEN}Finished {job['audio_file']} in {latency['processing_seconds']:.1f}s "
+              f"(queued {latency['queued_seconds']:.1f}s){Style.RESET_ALL}")
+        return {"ok": True, "result": result, "latency": latency}
+
+    def status(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                "pid": os.getpid(),
+                "uptime_seconds": time.time() - self.started_at,
+                "queue_depth": self.jobs.qsize() + self.active,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "mean_latency_seconds": sum(latencies) / len(latencies) if latencies else None,
+                "p95_latency_seconds": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None
+            }
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline())
+            op = message.get("op")
+            if op == "transcribe":
+                response = self.server.worker.submit(message)
+            elif op == "status":
+                response = {"ok": True, "status": self.server.worker.status()}
+            elif op == "stop":
+                response = {"ok": True}
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                response = {"ok": False, "error": f"Unknown operation: {op}"}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+def serve(socket_path=DAEMON_SOCKET, preload_diarization=True):
+    """Warm the models and serve jobs on socket_path until stopped"""
+    if os.path.exists(socket_path):
+        try:
+            request({"op": "status"}, socket_path)
+            print(f"{Fore.RED}A daemon is already running on {socket_path}{Style.RESET_ALL}")
+            return 1
+        except DaemonUnavailable:
+            os.remove(socket_path)  # Stale socket from a daemon that did not shut down cleanly
+
+    worker = WorkerDaemon(preload_diarization)
+    print(f"{Fore.CYAN}Warming up models...{Style.RESET_ALL}")
+    worker.warm_up()
+    threading.Thread(target=worker.run_jobs, daemon=True).start()
+
+    server = socketserver.ThreadingUnixStreamServer(socket_path, _RequestHandler)
+    server.daemon_threads = True
+    server.worker = worker
+    os.chmod(socket_path, 0o600)
+    print(f"{Fore.GREEN}ZoneSight daemon listening on {socket_path} (pid {os.getpid()}){Style.RESET_ALL}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.jobs.put(None)
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print(f"{Fore.YELLOW}ZoneSight daemon stopped{Style.RESET_ALL}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="ZoneSight worker daemon")
+    parser.add_argument("command", choices=["start", "status", "stop"])
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help=f"Unix socket path (default: {DAEMON_SOCKET})")
+    parser.add_argument("--no-diarization", action="store_true",
+                        help="Do not preload the diarization pipeline at start-up")
+    args = parser.parse_args()
+
+    if args.command == "start":
+        return serve(args.socket, preload_diarization=not args.no_diarization)
+    try:
+        response = request({"op": args.command}, args.socket)
+    except DaemonUnavailable as e:
+        print(f"{Fore.YELLOW}{e}{Style.RESET_ALL}")
+        return 1
+    if args.command == "status":
+        status = response["status"]
+        print(f"pid {status['pid']}, up {status['uptime_seconds'] / 60:.1f} min")
+        print(f"queue depth {status['queue_depth']} ({status['active']} active), "
+              f"{status['completed']} completed, {status['failed']} failed")
+        if status["mean_latency_seconds"] is not None:
+            print(f"job latency: mean {status['mean_latency_seconds']:.1f}s, p95 {status['p95_latency_seconds']:.1f}s")
+    else:
+        print("Stop requested")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+# Speaker embedding store for ZoneSight
+# Keeps one speaker embedding per diarization turn, taken from the embeddings
+# pyannote computes anyway while diarizing, so that a recording can be
+# re-clustered with a different speaker count or threshold in seconds instead
+# of re-running pyannote, and so that speakers can be matched against the
+# enrolled voices of known students by nearest-neighbour search.
+#
+# Usage:
+#   python src/embeddings.py recluster recording.mp3 --num-speakers 4
+#   python src/embeddings.py enroll recording.mp3 SPEAKER_01 "Student Name"
+#   python src/embeddings.py identify recording.mp3
+#   python src/embeddings.py voices
+
+import argparse
+import os
+import sys
+import numpy as np
+from colorama import Fore, Style
+from cache import make_key, array_get, array_put, cache_get, cache_put
+from config import VOICE_STORE, VOICE_MATCH_THRESHOLD
+from models import diarization_pipeline_version
+
+# Turns shorter than this give unreliable embeddings and are labelled from their neighbours
+MIN_TURN_SECONDS = 0.5
+# Centroid-linkage distance threshold on unit-length embeddings, as in pyannote/speaker-diarization-3.1
+CLUSTER_THRESHOLD = 0.7045654963945799
+
+def embedding_key(fingerprint):
+    return make_key(fingerprint, diarization_pipeline_version())
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-10)
+
+def chunk_turn_embeddings(turns, segmentations, embeddings):
+    """
+    Derive one embedding per turn from the speaker embeddings pyannote computes while diarizing.
+
+    Before clustering, the pipeline embeds every local speaker of every
+    (overlapping) chunk and hands the result to its hook as the "embeddings"
+    step, after the "segmentation" step they belong to. Each turn gets the
+    activity-weighted mean of, per chunk, the local speaker most active during
+    the turn, so no second pass over the audio is needed.
+
+    Args:
+        turns: List of (start, end, speaker) turns
+        segmentations: SlidingWindowFeature of (chunks, frames, local speakers) activations
+        embeddings: (chunks, local speakers, dimension) array; NaN rows for inactive speakers
+
+    Returns:
+        (n_turns, dimension) float32 array; rows of turns shorter than MIN_TURN_SECONDS are NaN
+    """
+    activity = np.asarray(segmentations.data) > 0.5
+    window = segmentations.sliding_window
+    n_chunks, n_frames, n_local = activity.shape
+    frame_seconds = window.duration / n_frames
+    # Active frames up to each frame boundary, so the activity within any span is one subtraction
+    cumulative = np.concatenate((np.zeros((n_chunks, 1, n_local)), np.cumsum(activity, axis=1)), axis=1)
+    usable = ~np.isnan(embeddings).any(axis=2)
+    unit = _normalize(np.nan_to_num(embeddings))
+
+    starts = np.array([turn[0] for turn in turns], dtype=np.float64)
+    ends = np.array([turn[1] for turn in turns], dtype=np.float64)
+    long_enough = ends - starts >= MIN_TURN_SECONDS
+    totals = np.zeros((len(turns), embeddings.shape[2]))
+    weights = np.zeros(len(turns))
+    for chunk in range(n_chunks):
+        chunk_start = window.start + chunk * window.step
+        overlapping = np.flatnonzero(long_enough & (starts < chunk_start + window.duration) & (ends > chunk_start))
+        if len(overlapping) == 0 or not usable[chunk].any():
+            continue
+        first = np.clip(np.round((starts[overlapping] - chunk_start) / frame_seconds).astype(int), 0, n_frames)
+        last = np.clip(np.round((ends[overlapping] - chunk_start) / frame_seconds).astype(int), 0, n_frames)
+        active = cumulative[chunk, last] - cumulative[chunk, first]
+        active[:, ~usable[chunk]] = 0
+        best = np.argmax(active, axis=1)
+        frames = active[np.arange(len(overlapping)), best]
+        hit = frames > 0
+        totals[overlapping[hit]] += frames[hit, None] * unit[chunk, best[hit]]
+        weights[overlapping[hit]] += frames[hit]
+
+    result = np.full((len(turns), embeddings.shape[2]), np.nan, dtype=np.float32)
+    embedded = weights > 0
+    result[embedded] = totals[embedded] / weights[embedded, None]
+    return result
+
+def store_turn_embeddings(fingerprint, turns, embeddings):
+    """Save the turns of one recording together with their embeddings"""
+    array_put("embeddings", embedding_key(fingerprint),
+              starts=np.array([turn[0] for turn in turns], dtype=np.float64),
+              ends=np.array([turn[1] for turn in turns], dtype=np.float64),
+              speakers=np.array([turn[2] for turn in turns], dtype=str),
+              embeddings=embeddings)
+
+def load_turn_embeddings(fingerprint):
+    """
+    Return the stored (turns, embeddings) of a recording, or None if it was never embedded.
+    """
+    arrays = array_get("embeddings", embedding_key(fingerprint))
+    if arrays is None:
+        return None
+    turns = [(float(start), float(end), str(speaker))
+             for start, end, speaker in zip(arrays["starts"], arrays["ends"], arrays["speakers"])]
+    return turns, arrays["embeddings"]
+
+def recluster(turns, embeddings, num_speakers=None, min_speakers=None, max_speakers=None,
+              threshold=CLUSTER_THRESHOLD):
+    """
+    Relabel turns by clustering their stored embeddings.
+
+    Without num_speakers, clusters are cut at threshold and then forced into
+    [min_speakers, max_speakers]. Turns without an embedding take the label of
+    the nearest embedded turn in time.
+
+    Returns:
+        List of (start, end, speaker) turns with SPEAKER_00-style labels in order of first appearance
+    """
+    from scipy.cluster.hierarchy import linkage, fcluster
+
+    valid = np.flatnonzero(~np.isnan(embeddings).any(axis=1))
+    if len(valid) == 0:
+        return list(turns)
+    if len(valid) == 1:
+        clusters = np.ones(1, dtype=int)
+    else:
+        tree = linkage(_normalize(embeddings[valid]), method="centroid", metric="euclidean")
+        if num_speakers:
+            clusters = fcluster(tree, num_speakers, criterion="maxclust")
+        else:
+            clusters = fcluster(tree, threshold, criterion="distance")
+            count = len(np.unique(clusters))
+            if max_speakers and count > max_speakers:
+                clusters = fcluster(tree, max_speakers, criterion="maxclust")
+            elif min_speakers and count < min_speakers:
+                clusters = fcluster(tree, min_speakers, criterion="maxclust")
+
+    labels = np.zeros(len(turns), dtype=int)
+    labels[valid] = clusters
+    midpoints = np.array([(start + end) / 2 for start, end, _ in turns])
+    for i in np.flatnonzero(labels == 0):
+        labels[i] = labels[valid[np.argmin(np.abs(midpoints[valid] - midpoints[i]))]]
+
+    names = {}
+    relabelled = []
+    for (start, end, _), label in sorted(zip(turns, labels)):
+        names.setdefault(label, f"SPEAKER_{len(names):02d}")
+        relabelled.append((start, end, names[label]))
+    return relabelled
+
+def speaker_centroids(turns, embeddings):
+    """Return {speaker: unit-length, duration-weighted mean embedding} for the given labelling"""
+    sums = {}
+    for (start, end, speaker), embedding in zip(turns, embeddings):
+        if np.isnan(embedding).any():
+            continue
+        sums[speaker] = sums.get(speaker, 0) + (end - start) * _normalize(embedding)
+    return {speaker: _normalize(total) for speaker, total in sums.items()}
+
+def load_voices(path=VOICE_STORE):
+    """Return (names, unit-length embedding matrix, enrolment counts) of the known voices"""
+    if not os.path.exists(path):
+        return [], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=int)
+    with np.load(path, allow_pickle=False) as store:
+        return [str(name) for name in store["names"]], store["embeddings"], store["counts"]
+
+def enroll_voice(name, embedding, path=VOICE_STORE):
+    """Add a recording of name's voice to the store, averaging with earlier enrolments"""
+    names, matrix, counts = load_voices(path)
+    embedding = _normalize(np.asarray(embedding, dtype=np.float32))
+    if name in names:
+        i = names.index(name)
+        matrix[i] = _normalize(matrix[i] * counts[i] + embedding)
+        counts[i] += 1
+    else:
+        names.append(name)
+        matrix = np.vstack([matrix, embedding[None]]) if len(matrix) else embedding[None]
+        counts = np.append(counts, 1)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, names=np.array(names, dtype=str), embeddings=matrix, counts=counts)
+    os.replace(tmp_path, path)
+
+def match_speakers(centroids, threshold=VOICE_MATCH_THRESHOLD, path=VOICE_STORE):
+    """
+    Match speakers to known voices by cosine similarity.
+
+    Each known voice is given to at most one speaker, best matches first.
+
+    Returns:
+        {speaker: (name, similarity)} for the speakers whose nearest voice is above threshold
+    """
+    names, matrix, _ = load_voices(path)
+    if not names or not centroids:
+        return {}
+    speakers = list(centroids)
+    similarity = np.stack([centroids[speaker] for speaker in speakers]) @ matrix.T
+    matches = {}
+    taken = set()
+    for flat in np.argsort(similarity, axis=None)[::-1]:
+        row, column = np.unravel_index(flat, similarity.shape)
+        if similarity[row, column] < threshold:
+            break
+        if speakers[row] in matches or column in taken:
+            continue
+        matches[speakers[row]] = (names[column], float(similarity[row, column]))
+        taken.add(column)
+    return matches
+
+def embedded_turns(turns, stored):
+    """
+    Pair turns with stored embeddings by their boundaries, so that re-clustered labellings match too.
+
+    Returns:
+        (turns that have an embedding, their (n, dimension) embeddings)
+    """
+    by_bounds = {(start, end): embedding for (start, end, _), embedding in zip(*stored)}
+    kept = [turn for turn in turns if tuple(turn[:2]) in by_bounds]
+    if not kept:
+        return [], np.zeros((0, stored[1].shape[1]), dtype=np.float32)
+    return kept, np.stack([by_bounds[tuple(turn[:2])] for turn in kept])
+
+def name_known_speakers(turns, fingerprint):
+    """Relabel turns whose speaker matches an enrolled voice with that student's name"""
+    if not os.path.exists(VOICE_STORE):
+        return turns
+    stored = load_turn_embeddings(fingerprint)
+    if stored is None:
+        return turns
+    matches = match_speakers(speaker_centroids(*embedded_turns(turns, stored)))
+    for speaker, (name, similarity) in matches.items():
+        print(f"{Fore.GREEN}{speaker} matches the enrolled voice of {name} ({similarity:.2f}){Style.RESET_ALL}")
+    return [(start, end, matches[speaker][0] if speaker in matches else speaker) for start, end, speaker in turns]
+
+def main():
+    import audio as audio_utils
+    from main import diarization_cache_key, speaker_hints
+
+    parser = argparse.ArgumentParser(description="Re-cluster speakers and manage known voices")
+    parser.add_argument("command", choices=["recluster", "enroll", "identify", "voices"])
+    parser.add_argument("audio", nargs="?", help="Recording that has been diarized before")
+    parser.add_argument("speaker", nargs="?", help="enroll: diarization label of the student, e.g. SPEAKER_01")
+    parser.add_argument("name", nargs="?", help="enroll: name to store the voice under")
+    parser.add_argument("--num-speakers", type=int, help="Exact number of speakers (enroll/identify: of the diarization to use)")
+    parser.add_argument("--min-speakers", type=int, help="Lower bound on the number of speakers")
+    parser.add_argument("--max-speakers", type=int, help="Upper bound on the number of speakers")
+    parser.add_argument("--threshold", type=float, default=CLUSTER_THRESHOLD,
+                        help=f"recluster: clustering distance threshold (default: {CLUSTER_THRESHOLD:.3f})")
+    args = parser.parse_args()
+
+    if args.command == "voices":
+        names, _, counts = load_voices()
+        for name, count in zip(names, counts):
+            print(f"{name}  ({count} recordings)")
+        print(f"{len(names)} known voices in {VOICE_STORE}")
+        return 0
+
+    if not args.audio:
+        parser.error(f"{args.command} needs an audio file")
+    fingerprint = audio_utils.audio_fingerprint(audio_utils.load_audio(args.audio))
+    stored = load_turn_embeddings(fingerprint)
+    if stored is None:
+        print(f"{Fore.RED}No stored embeddings for {args.audio}; diarize it first{Style.RESET_ALL}")
+        return 1
+    hints = speaker_hints(args.num_speakers, args.min_speakers, args.max_speakers)
+    diarization_key = diarization_cache_key(fingerprint, **hints)
+
+    if args.command == "recluster":
+        turns = recluster(*stored, threshold=args.threshold, **hints)
+        # Later runs of the same recording with the same speaker hints pick up the new labelling
+        cache_put("diarization", diarization_key, turns)
+        talk_time = {}
+        for start, end, speaker in turns:
+            talk_time[speaker] = talk_time.get(speaker, 0.0) + end - start
+        for speaker, seconds in sorted(talk_time.items()):
+            print(f"{speaker}  {seconds / 60:.1f} min")
+        print(f"{len(talk_time)} speakers; saved as the diarization of {args.audio}")
+        return 0
+
+    # Use the labels of the latest (possibly re-clustered) diarization, as seen in the transcripts
+    current = cache_get("diarization", diarization_key)
+    turns, embeddings = embedded_turns(current, stored) if current else stored
+    if args.command == "enroll":
+        if not args.speaker or not args.name:
+            parser.error("enroll needs a speaker label and a name")
+        centroids = speaker_centroids(turns, embeddings)
+        if args.speaker not in centroids:
+            print(f"{Fore.RED}No embedded turns for {args.speaker}; speakers are {', '.join(sorted(centroids))}{Style.RESET_ALL}")
+            return 1
+        enroll_voice(args.name, centroids[args.speaker])
+        print(f"Enrolled {args.speaker} of {args.audio} as {args.name}")
+    else:
+        matches = match_speakers(speaker_centroids(turns, embeddings))
+        for speaker in sorted({turn[2] for turn in turns}):
+            name, similarity = matches.get(speaker, (None, None))
+            print(f"{speaker}  {name} ({similarity:.2f})" if name else f"{speaker}  unknown")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
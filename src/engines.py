@@ -0,0 +1,69 @@
+# Transcription engines for ZoneSight
+# Every backend turns a 16 kHz mono float32 array (or a file path) into the
+# same list of {"start", "end", "text"} segments, so the rest of the pipeline
+# does not care which one produced them. Select one with TRANSCRIPTION_ENGINE
+# or jam.py --engine.
+
+from abc import ABC, abstractmethod
+from config import TRANSCRIPTION_ENGINE
+from models import get_whisper_model, get_faster_whisper_model
+from transcription import transcribe_segments, decode_settings
+
+class TranscriptionEngine(ABC):
+    """Interface implemented by every transcription backend"""
+
+    name = None
+    # Whether transcription.transcribe_windows_batched can drive this engine's model
+    supports_batching = False
+
+    @abstractmethod
+    def load(self):
+        """Load the engine's model so the first transcription does not pay for it"""
+
+    @abstractmethod
+    def transcribe(self, audio, offset=0.0):
+        """Return {"start", "end", "text"} segments with timestamps shifted by offset"""
+
+    def settings(self, **extra):
+        """Return the settings that determine this engine's transcripts, for cache keys"""
+        return decode_settings(engine=self.name, **extra)
+
+class WhisperEngine(TranscriptionEngine):
+    """The openai-whisper package running on torch"""
+
+    name = "whisper"
+    supports_batching = True
+
+    def load(self):
+        get_whisper_model()
+
+    def transcribe(self, audio, offset=0.0):
+        return transcribe_segments(audio, offset)
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """Whisper running on CTranslate2 through the faster-whisper package"""
+
+    name = "faster-whisper"
+
+    def load(self):
+        get_faster_whisper_model()
+
+    def transcribe(self, audio, offset=0.0):
+        model = get_faster_whisper_model()
+        # Greedy decoding without the built-in VAD matches the whisper engine's behaviour;
+        # silence is already removed by our own chunking
+        segments, _ = model.transcribe(audio, beam_size=1, vad_filter=False)
+        return [{
+            "start": segment.start + offset,
+            "end": segment.end + offset,
+            "text": segment.text
+        } for segment in segments]
+
+ENGINES = {engine.name: engine for engine in (WhisperEngine, FasterWhisperEngine)}
+
+def get_engine(name=None):
+    """Return the transcription engine called name (default: TRANSCRIPTION_ENGINE)"""
+    name = name or TRANSCRIPTION_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown transcription engine '{name}', expected one of {tuple(ENGINES)}")
+    return ENGINES[name]()
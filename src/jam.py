@@ -9,12 +9,17 @@ import csv
 from colorama import Fore, Style
 from main import (
     transcribe_and_diarize,
+    pretranscribe_batch,
+    speaker_hints,
     read_competency_definitions,
-    extract_competency_insights,
+    extract_speaker_insights,
     generate_combined_report,
     generate_structured_json,
     display_intro
 )
+from models import model_stats, format_model_stats
+from llm_client import reset_retry_budget
+from daemon import submit_transcription, DaemonUnavailable, request as daemon_request
 from portfolio.portfolio import (
     get_portfolio_paths,
     analyze_portfolio,
@@ -22,7 +27,24 @@ from portfolio.portfolio import (
     generate_structured_json as generate_portfolio_json
 )
 from datetime import datetime
-from config import OPENROUTER_API_KEY, OPENROUTER_URL, OPENROUTER_MODEL
+from config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_URL,
+    OPENROUTER_MODEL,
+    TRANSCRIBE_WORKERS,
+    TORCH_THREADS_PER_WORKER,
+    WHISPER_BATCH_SIZE,
+    MEMORY_LIMIT_MB,
+    TRANSCRIPTION_ENGINE,
+    CONCURRENT_DIARIZATION,
+    DIARIZE_FIRST,
+    NUM_SPEAKERS,
+    MIN_SPEAKERS,
+    MAX_SPEAKERS,
+    LLM_MAX_CONCURRENCY,
+    LLM_CACHE
+)
+from engines import ENGINES
 
 def print_data_jam_banner():
     """Print the TPZ Data Jam banner"""
@@ -37,9 +59,79 @@ def log_progress(message, color=Fore.GREEN):
     formatted_message = f"[{timestamp}] {message}"
     print(f"{color}{formatted_message}{Style.RESET_ALL}")
 
+def daemon_running(args):
+    """Check whether audio jobs will go to the worker daemon"""
+    if not args.daemon:
+        return False
+    try:
+        daemon_request({"op": "status"})
+        return True
+    except (DaemonUnavailable, RuntimeError):
+        return False
+
+def batch_pretranscription(args, audio_files):
+    """
+    Check whether the files should first be transcribed together in shared decode batches.
+
+    Not when streaming within a memory limit or handing jobs to the daemon, and not
+    with diarize-first, which transcribes only the selected speakers' regions
+    and would never use the whole-recording transcripts.
+    """
+    if args.batch_size <= 1 or len(audio_files) <= 1 or args.max_memory_mb:
+        return False
+    if args.diarization and args.diarize_first:
+        return False
+    return not daemon_running(args)
+
+def file_speaker_hints(audio_file, args):
+    """Return the diarization speaker-count hints for one file: its CSV columns, else the command-line values"""
+    if audio_file in args.csv_speaker_hints:
+        return args.csv_speaker_hints[audio_file]
+    return speaker_hints(args.num_speakers, args.min_speakers, args.max_speakers)
+
+def transcribe_file(audio_file, args):
+    """Transcribe on the warm worker daemon when one is running, otherwise in-process"""
+    if args.daemon:
+        try:
+            speaker_transcripts, latency = submit_transcription(
+                audio_file,
+                args.diarization,
+                workers=args.workers,
+                threads_per_worker=args.threads_per_worker,
+                batch_size=args.batch_size,
+                memory_limit_mb=args.max_memory_mb,
+                engine=args.engine,
+                concurrent_diarization=args.concurrent_diarization,
+                diarize_first=args.diarize_first,
+                hints=file_speaker_hints(audio_file, args)
+            )
+            log_progress(f"Daemon finished {audio_file} in {latency['total_seconds']:.1f}s "
+                         f"(queued {latency['queued_seconds']:.1f}s)", Fore.CYAN)
+            return speaker_transcripts
+        except DaemonUnavailable:
+            log_progress("No ZoneSight daemon running, transcribing in-process", Fore.YELLOW)
+            args.daemon = False
+        except RuntimeError as e:
+            log_progress(f"Daemon error for {audio_file}: {e}", Fore.RED)
+            return None
+    
+    return transcribe_and_diarize(
+        audio_file, 
+        args.diarization,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        batch_size=args.batch_size,
+        memory_limit_mb=args.max_memory_mb,
+        engine=args.engine,
+        concurrent_diarization=args.concurrent_diarization,
+        diarize_first=args.diarize_first,
+        hints=file_speaker_hints(audio_file, args)
+    )
+
 def process_audio(args):
     """Process audio files"""
     log_progress("Starting audio analysis...", Fore.CYAN)
+    reset_retry_budget()
     
     # Read competency definitions
     competency_file = args.competency if args.competency else "test_full.rtf"
@@ -49,6 +141,12 @@ def process_audio(args):
         log_progress("Failed to read competency definitions", Fore.RED)
         return False
     
+    # Decode the whole batch together when batched transcription is enabled
+    existing_files = [audio_file for audio_file in args.input if os.path.exists(audio_file)]
+    if batch_pretranscription(args, existing_files):
+        log_progress(f"Batch-transcribing {len(existing_files)} files...", Fore.CYAN)
+        pretranscribe_batch(existing_files, args.batch_size, args.engine)
+    
     # Process each audio file
     all_reports = []
     for audio_file in args.input:
@@ -60,10 +158,7 @@ def process_audio(args):
         
         # Transcribe and diarize
         log_progress(f"Transcribing {audio_file}...", Fore.CYAN)
-        speaker_transcripts = transcribe_and_diarize(
-            audio_file, 
-            args.diarization
-        )
+        speaker_transcripts = transcribe_file(audio_file, args)
         
         if speaker_transcripts is None:
             log_progress(f"Failed to process {audio_file}, skipping to next file", Fore.RED)
@@ -71,17 +166,13 @@ def process_audio(args):
         
         # Extract insights
         log_progress(f"Extracting competency insights for {audio_file}...", Fore.CYAN)
-        competency_data = {}
-        
-        if len(speaker_transcripts) == 1 and "Speaker 1" in speaker_transcripts:
-            speaker = "Single Speaker"
-            transcript = speaker_transcripts["Speaker 1"]
-            log_progress(f"Analyzing {speaker}...", Fore.CYAN)
-            competency_data[speaker] = extract_competency_insights(transcript, competency_definitions)
-        else:
-            for speaker, transcript in speaker_transcripts.items():
-                log_progress(f"Analyzing {speaker}...", Fore.CYAN)
-                competency_data[speaker] = extract_competency_insights(transcript, competency_definitions)
+        competency_data = extract_speaker_insights(
+            speaker_transcripts, competency_definitions,
+            max_concurrency=args.llm_concurrency,
+            cache=args.llm_cache,
+            cache_only=args.cache_only,
+            on_start=lambda speaker: log_progress(f"Analyzing {speaker}...", Fore.CYAN)
+        )
         
         # Create results directory if it doesn't exist
         os.makedirs('results', exist_ok=True)
@@ -119,6 +210,10 @@ def process_audio(args):
         # Add this file's reports to the overall list
         all_reports.extend(file_reports)
     
+    # Report on the shared Whisper models used across the batch
+    for stats in model_stats():
+        log_progress(format_model_stats(stats), Fore.CYAN)
+    
     # Summary
     if all_reports:
         log_progress(f"Audio analysis complete! Generated {len(all_reports)} files:", Fore.GREEN)
@@ -132,6 +227,7 @@ def process_audio(args):
 def process_portfolio(args):
     """Process portfolio URLs"""
     log_progress("Starting portfolio analysis...", Fore.CYAN)
+    reset_retry_budget()
     
     # Read competency definitions
     competency_file = args.competency if args.competency else "test_full.rtf"
@@ -165,7 +261,9 @@ def process_portfolio(args):
             competency_definitions,
             OPENROUTER_API_KEY,
             OPENROUTER_URL,
-            OPENROUTER_MODEL
+            OPENROUTER_MODEL,
+            cache=args.llm_cache,
+            cache_only=args.cache_only
         )
         
         if analysis_data is None:
@@ -230,15 +328,41 @@ def process_video(args):
     log_progress("This feature will be available in a future update.", Fore.YELLOW)
     return False
 
-def process_csv_input(csv_file):
-    """Process a CSV file containing input files or URLs"""
+def process_csv_input(csv_file, speaker_columns=False):
+    """
+    Process a CSV file containing input files or URLs.
+
+    The first column holds the input. Under a header row naming them,
+    num_speakers, min_speakers and max_speakers columns guide diarization for
+    that file; with speaker_columns set (audio runs), the columns after the
+    input are read as those three in that order even without a header. Any
+    other columns are ignored, and a speaker count that is not a whole number
+    is skipped with a warning.
+
+    Returns:
+        List of (input, speaker hints) tuples
+    """
+    hint_names = ("num_speakers", "min_speakers", "max_speakers")
+    columns = ["input", *hint_names] if speaker_columns else ["input"]
     inputs = []
     try:
         with open(csv_file, 'r', newline='') as file:
             reader = csv.reader(file)
-            for row in reader:
-                if row and row[0].strip():  # Skip empty rows
-                    inputs.append(row[0].strip())
+            for i, row in enumerate(reader):
+                cells = [cell.strip() for cell in row]
+                if i == 0 and any(cell.lower() in hint_names for cell in cells):
+                    columns = [cell.lower() for cell in cells]  # Header row
+                    continue
+                if cells and cells[0]:  # Skip empty rows
+                    values = dict(zip(columns, cells))
+                    counts = []
+                    for name in hint_names:
+                        try:
+                            counts.append(int(values[name]) if values.get(name) else None)
+                        except ValueError:
+                            log_progress(f"Ignoring {name} '{values[name]}' for {cells[0]}: not a whole number", Fore.YELLOW)
+                            counts.append(None)
+                    inputs.append((cells[0], speaker_hints(*counts)))
         return inputs
     except Exception as e:
         log_progress(f"Error reading CSV file: {e}", Fore.RED)
@@ -262,6 +386,13 @@ Examples:
   
   # Analyze inputs from a CSV file
   python jam.py --type a --csv inputs.csv
+  
+  # Transcribe long recordings on 4 worker processes with 4 threads each
+  python jam.py --type a --workers 4 --threads-per-worker 4 long_session.mp3
+  
+  # Keep models warm between runs (jobs are sent to the daemon automatically)
+  python daemon.py start &
+  python jam.py --type a audio_file.mp3
 """
     )
     
@@ -292,9 +423,107 @@ Examples:
         help="Enable speaker diarization for audio analysis"
     )
     
+    parser.add_argument(
+        "--num-speakers",
+        type=int,
+        default=NUM_SPEAKERS,
+        help="Number of speakers in each recording, when known (default: let diarization decide)"
+    )
+    
+    parser.add_argument(
+        "--min-speakers",
+        type=int,
+        default=MIN_SPEAKERS,
+        help="Lower bound on the number of speakers"
+    )
+    
+    parser.add_argument(
+        "--max-speakers",
+        type=int,
+        default=MAX_SPEAKERS,
+        help="Upper bound on the number of speakers; fewer spurious speakers means fewer LLM calls"
+    )
+    
+    parser.add_argument(
+        "--concurrent-diarization",
+        action="store_true",
+        default=CONCURRENT_DIARIZATION,
+        help="Run diarization in parallel with transcription instead of after it"
+    )
+    
+    parser.add_argument(
+        "--diarize-first",
+        action="store_true",
+        default=DIARIZE_FIRST,
+        help="Diarize before transcribing and skip speakers below MIN_SPEAKER_SECONDS or in EXCLUDE_SPEAKERS"
+    )
+    
+    parser.add_argument(
+        "--engine", "-e",
+        default=TRANSCRIPTION_ENGINE,
+        choices=list(ENGINES),
+        help=f"Transcription engine (default: {TRANSCRIPTION_ENGINE})"
+    )
+    
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=TRANSCRIBE_WORKERS,
+        help=f"Worker processes for parallel chunk transcription, each holding its own model (default: {TRANSCRIBE_WORKERS})"
+    )
+    
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=TORCH_THREADS_PER_WORKER,
+        help="Torch threads per transcription worker (default: CPU cores divided by workers)"
+    )
+    
+    parser.add_argument(
+        "--batch-size", "-b",
+        type=int,
+        default=WHISPER_BATCH_SIZE,
+        help=f"Decode this many 30-second windows per Whisper call, across all input files (default: {WHISPER_BATCH_SIZE})"
+    )
+    
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        default=MEMORY_LIMIT_MB,
+        help="Stream long recordings and transcribe them window by window within this audio memory budget (default: off)"
+    )
+    
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        default=LLM_MAX_CONCURRENCY,
+        help=f"Analyze up to this many speakers at once with the LLM (default: {LLM_MAX_CONCURRENCY})"
+    )
+    
+    llm_cache = parser.add_mutually_exclusive_group()
+    llm_cache.add_argument(
+        "--no-cache",
+        dest="llm_cache",
+        action="store_false",
+        default=LLM_CACHE,
+        help="Always call the LLM, neither reusing nor storing cached responses"
+    )
+    llm_cache.add_argument(
+        "--cache-only",
+        action="store_true",
+        help="Replay cached LLM responses without calling the LLM; requests with no cached response fail"
+    )
+    
+    parser.add_argument(
+        "--no-daemon",
+        dest="daemon",
+        action="store_false",
+        help="Always transcribe in-process, even when a ZoneSight daemon is running"
+    )
+    
     parser.add_argument(
         "--csv",
-        help="CSV file containing input files or URLs (one per line)"
+        help="CSV file containing input files or URLs (one per line), optionally followed by num_speakers, min_speakers, max_speakers"
     )
     
     # Input files or URLs
@@ -305,6 +534,7 @@ Examples:
     )
     
     args = parser.parse_args()
+    args.csv_speaker_hints = {}
     
     # Print banner
     print_data_jam_banner()
@@ -312,9 +542,10 @@ Examples:
     # Process CSV input if provided
     if args.csv:
         if os.path.exists(args.csv):
-            csv_inputs = process_csv_input(args.csv)
+            csv_inputs = process_csv_input(args.csv, speaker_columns=args.type.lower() in ["a", "audio"])
             if csv_inputs:
-                args.input.extend(csv_inputs)
+                args.input.extend(csv_input for csv_input, _ in csv_inputs)
+                args.csv_speaker_hints = {csv_input: hints for csv_input, hints in csv_inputs if hints}
             else:
                 log_progress("No valid inputs found in CSV file", Fore.RED)
                 return 1
@@ -0,0 +1,332 @@
+# Shared LLM client for ZoneSight
+# One pooled keep-alive HTTP session for every OpenRouter call made by the
+# audio and portfolio analyses, so that a batch reuses its TLS connections,
+# with connect/read timeouts and optional gzip-compressed request bodies.
+# Throttled and failed requests are retried with jittered exponential
+# backoff that honours Retry-After, drawing on a retry budget shared by the
+# whole batch, and a circuit breaker pauses every caller while the provider
+# keeps failing instead of letting each one burn through its retries.
+# Successful responses are kept in the artifact cache, keyed by the endpoint,
+# model, messages and sampling parameters, so identical requests are replayed
+# for free until they expire. Stable prompt prefixes can be marked for
+# provider-side prompt caching, and cache-hit tokens are logged from usage.
+
+import gzip
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from colorama import Fore, Style
+from cache import make_key, cache_get, cache_put
+from requests.adapters import HTTPAdapter
+from config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_URL,
+    OPENROUTER_MODEL,
+    SITE_URL,
+    SITE_NAME,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_POOL_SIZE,
+    LLM_GZIP_MIN_KB,
+    LLM_PROMPT_CACHE,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+    LLM_RETRY_BUDGET,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_COOLDOWN,
+    LLM_CACHE,
+    LLM_CACHE_TTL_HOURS
+)
+
+LLM_CACHE_NAMESPACE = "llm"
+
+# Rate limiting, request timeouts and transient server errors; other 4xx will fail again
+RETRY_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=LLM_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+class CacheMiss(LookupError):
+    """Raised in cache-only mode when a request has no cached response"""
+
+class ProviderError(requests.HTTPError):
+    """A 2xx response whose body reports an error instead of a completion"""
+
+    def __init__(self, message, code=None, response=None):
+        super().__init__(message, response=response)
+        self.code = code
+
+class RetryBudgetExhausted(requests.RequestException):
+    """Raised instead of retrying once the batch has used up its retry budget"""
+
+class RetryBudget:
+    """Retries shared by every request of a batch, so a throttled batch cannot retry forever"""
+
+    def __init__(self, retries):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Use up one retry; return False if none are left"""
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+class CircuitBreaker:
+    """
+    Stop sending requests while the provider keeps failing.
+
+    After `failures` consecutive failures the breaker opens and callers wait
+    out the cooldown. A single probe request then goes through; its success
+    closes the breaker, its failure opens it again for another cooldown.
+    """
+
+    def __init__(self, failures, cooldown):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        with self._condition:
+            while self._opened_at is not None:
+                wait = self._opened_at + self.cooldown - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                elif not self._probing:
+                    self._probing = True
+                    return
+                else:
+                    self._condition.wait()
+
+    def record_success(self):
+        with self._condition:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+            self._condition.notify_all()
+
+    def record_failure(self):
+        with self._condition:
+            self._consecutive += 1
+            if self._probing or (self.failures and self._consecutive >= self.failures):
+                if self._opened_at is None or self._probing:
+                    print(f"{Fore.YELLOW}LLM provider keeps failing; pausing requests for {self.cooldown:g}s{Style.RESET_ALL}")
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self._condition.notify_all()
+
+_budget = RetryBudget(LLM_RETRY_BUDGET)
+_breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+
+def reset_retry_budget(retries=LLM_RETRY_BUDGET):
+    """Start a new batch with a fresh retry budget"""
+    global _budget
+    _budget = RetryBudget(retries)
+
+def retry_after_seconds(response):
+    """Return the delay requested by a response's Retry-After header, or None"""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_seconds(attempt, retry_after=None):
+    """Full-jitter exponential backoff for the given retry attempt, never shorter than retry_after"""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        # A little jitter on top so throttled callers do not all come back at once
+        delay = retry_after + random.uniform(0, LLM_BACKOFF_SECONDS)
+    return delay
+
+def is_retryable(error):
+    """Whether a failed request is worth retrying"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, ProviderError):
+        # Upstream failures reported in a 200 body carry their own status code, if any
+        return error.code is None or error.code in RETRY_STATUSES
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in RETRY_STATUSES
+
+def prompt_cache_block(text):
+    """
+    Return a text content block marking the end of a prompt prefix that the provider may cache.
+
+    Anthropic and Gemini models on OpenRouter cache up to the cache_control
+    breakpoint; OpenAI-style providers cache long identical prefixes on their own
+    and ignore the marker.
+    """
+    block = {"type": "text", "text": text}
+    if LLM_PROMPT_CACHE:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+def log_usage(result):
+    """Print token usage, including prompt tokens served from the provider's prompt cache"""
+    usage = result.get("usage") or {}
+    if not usage:
+        return
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") or usage.get("cache_read_input_tokens") or 0
+    written = details.get("cache_write_tokens") or usage.get("cache_creation_input_tokens") or 0
+    prompt = usage.get("prompt_tokens", 0)
+    message = f"LLM usage: {prompt} prompt tokens ({cached} from prompt cache"
+    if written:
+        message += f", {written} written to it"
+    print(f"{Fore.CYAN}{message}), {usage.get('completion_tokens', 0)} completion tokens{Style.RESET_ALL}")
+
+def response_content(result):
+    """Return the message content of a chat completion response, or None if it has none"""
+    try:
+        content = result["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return content if isinstance(content, str) and content.strip() else None
+
+def usable_response(result, validate=None):
+    """Whether a response has content that validate (if given) accepts, and so may be cached"""
+    content = response_content(result)
+    if content is None:
+        return False
+    if validate:
+        try:
+            validate(content)
+        except (ValueError, KeyError, TypeError):
+            return False
+    return True
+
+def cached_response(key, validate=None):
+    """Return the cached response for a request key, or None if missing, expired or unusable"""
+    entry = cache_get(LLM_CACHE_NAMESPACE, key)
+    if entry is None:
+        return None
+    if LLM_CACHE_TTL_HOURS and time.time() - entry["created"] > LLM_CACHE_TTL_HOURS * 3600:
+        return None
+    if not usable_response(entry["response"], validate):
+        return None
+    return entry["response"]
+
+def chat_completion(messages, model=None, url=None, api_key=None, timeout=None, max_retries=LLM_MAX_RETRIES,
+                    cache=LLM_CACHE, cache_only=False, validate=None, **params):
+    """
+    Send a chat completion request and return the parsed JSON response.
+
+    Connection errors, timeouts, 429s and 5xx responses are retried up to
+    max_retries times while the batch's retry budget lasts. With cache on,
+    a response cached for the same endpoint, model, messages and parameters
+    is returned without calling the provider. Only responses with content
+    that validate accepts are cached, so a bad reply is not replayed.
+
+    Args:
+        messages: Chat messages in OpenAI format
+        model: Model name (default: OPENROUTER_MODEL)
+        url: Chat completions endpoint (default: OPENROUTER_URL)
+        api_key: API key (default: OPENROUTER_API_KEY)
+        timeout: (connect, read) seconds (default: LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+        max_retries: Retries for this request (default: LLM_MAX_RETRIES)
+        cache: Read and store responses in the LLM cache (default: LLM_CACHE)
+        cache_only: Only replay cached responses, never calling the provider
+        validate: Optional callable that raises ValueError when the message content
+            cannot be used, e.g. json.loads; such responses are returned but not cached
+        **params: Sampling parameters such as temperature and max_tokens
+
+    Returns:
+        The response body as a dictionary
+
+    Raises:
+        requests.RequestException: On connection errors, timeouts, non-2xx responses and
+            2xx error bodies that were not retried or are still failing after the last retry
+        CacheMiss: In cache-only mode, when there is no cached response
+    """
+    payload = {"model": model or OPENROUTER_MODEL, "messages": messages, **params}
+    url = url or OPENROUTER_URL
+    # The API key is left out so that rotating it keeps the cache
+    cache_key = make_key("chat_completion", url, payload)
+    if cache or cache_only:
+        cached = cached_response(cache_key, validate)
+        if cached is not None:
+            print(f"{Fore.GREEN}Using cached LLM response{Style.RESET_ALL}")
+            return cached
+        if cache_only:
+            raise CacheMiss(f"No cached LLM response for this request (model {payload['model']})")
+
+    body = json.dumps(payload).encode("utf-8")
+    headers = {
+        "Authorization": f"Bearer {api_key or OPENROUTER_API_KEY}",
+        "HTTP-Referer": SITE_URL,
+        "X-Title": SITE_NAME,
+        "Content-Type": "application/json"
+    }
+    # Base64 PDFs and long transcripts shrink considerably; only for providers that accept it
+    if LLM_GZIP_MIN_KB and len(body) >= LLM_GZIP_MIN_KB * 1024:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+
+    attempt = 0
+    while True:
+        _breaker.acquire()
+        try:
+            response = get_session().post(url, data=body, headers=headers,
+                                          timeout=timeout or (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT))
+            if not response.ok:
+                raise requests.HTTPError(f"{response.status_code} {response.reason}: {response.text[:500]}", response=response)
+            result = response.json()
+            if isinstance(result, dict) and result.get("error"):
+                # OpenRouter reports some upstream failures as a 200 with an error body
+                error = result["error"]
+                code = error.get("code") if isinstance(error, dict) else None
+                message = error.get("message", error) if isinstance(error, dict) else error
+                label = f"Provider error {code}" if code else "Provider error"
+                raise ProviderError(f"{label}: {str(message)[:500]}", code=code if isinstance(code, int) else None,
+                                    response=response)
+        except requests.RequestException as e:
+            if not is_retryable(e):
+                # The provider answered; the request itself is at fault
+                _breaker.record_success()
+                raise
+            _breaker.record_failure()
+            if attempt >= max_retries:
+                raise
+            if not _budget.take():
+                raise RetryBudgetExhausted(f"Retry budget for this batch is used up; last error: {e}") from e
+            delay = backoff_seconds(attempt, retry_after_seconds(getattr(e, "response", None)))
+            attempt += 1
+            print(f"{Fore.YELLOW}LLM request failed ({e.__class__.__name__}: {str(e)[:120]}); "
+                  f"retry {attempt}/{max_retries} in {delay:.1f}s{Style.RESET_ALL}")
+            time.sleep(delay)
+            continue
+        _breaker.record_success()
+        log_usage(result)
+        if cache and usable_response(result, validate):
+            cache_put(LLM_CACHE_NAMESPACE, cache_key, {"created": time.time(), "response": result})
+        return result
@@ -4,23 +4,30 @@ warnings.filterwarnings("ignore", message="torchaudio._backend.set_audio_backend
 
 # Note: On macOS, pyobjc-framework-Cocoa is required for AppKit module
 # which is used by some audio processing libraries
-import whisper  # Import the open source whisper package
-from pyannote.audio import Pipeline
 import requests
 import os
-import sys
 import argparse
-import subprocess
 import json
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
-from pydub import AudioSegment
 from config import *
 from colorama import init, Fore, Back, Style
 from playsound import playsound
 from pygame import mixer
 from cleanup import cleanup_temp_files
+from llm_client import chat_completion, prompt_cache_block
+from engines import get_engine
+from models import get_diarization_pipeline, diarization_pipeline_version, DiarizationUnavailable
+from transcription import transcribe_windows_batched, split_windows, WINDOW_SECONDS
+from cache import make_key, cache_get, cache_put, job_dir, load_checkpoint, save_checkpoint, clear_job
+from transcription_pool import transcribe_chunks_parallel
+import audio as audio_utils
+import numpy as np
+from vad import vad_chunks, speech_ratio, frame_energy_db, speech_threshold_db, VAD_VERSION
+from speakers import assign_speakers, speaker_turns, select_speakers, speaker_regions, talk_time
+from embeddings import chunk_turn_embeddings, store_turn_embeddings, load_turn_embeddings, recluster, name_known_speakers
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from striprtf.striprtf import rtf_to_text
 from datetime import datetime
 
@@ -52,78 +59,56 @@ def play_background_music():
 def stop_background_music():
     mixer.music.stop()
 
-def convert_to_wav(input_file):
-    if input_file.lower().endswith('.wav'):
-        return input_file
-    
-    output_file = os.path.splitext(input_file)[0] + '.wav'
-    try:
-        subprocess.run(['ffmpeg', '-i', input_file, output_file], check=True)
-        print_colored(f"Converted {input_file} to {output_file}", Fore.GREEN)
-        return output_file
-    except subprocess.CalledProcessError as e:
-        print_colored(f"Error converting file to WAV: {e}", Fore.RED)
-        return None
-
-def split_audio(file_path, max_size_mb=24):
-    audio = AudioSegment.from_wav(file_path)
-    max_size_bytes = max_size_mb * 1024 * 1024
-    duration_ms = len(audio)
-    chunk_duration_ms = int((max_size_bytes / len(audio.raw_data)) * duration_ms)
-    
-    # Create temp directory if it doesn't exist
-    temp_dir = "temp"
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
-    
-    chunks = []
-    for i, chunk_start in enumerate(range(0, duration_ms, chunk_duration_ms)):
-        chunk_end = min(chunk_start + chunk_duration_ms, duration_ms)
-        chunk = audio[chunk_start:chunk_end]
-        chunk_file = os.path.join(temp_dir, f"chunk_{i}.wav")
-        chunk.export(chunk_file, format="wav")
-        chunks.append(chunk_file)
-        
-        print_colored(f"Chunk {i}: Start={chunk_start}ms, End={chunk_end}ms, Duration={chunk_end-chunk_start}ms, Size={os.path.getsize(chunk_file)} bytes", Fore.YELLOW)
-    
+def split_audio(audio, chunk_seconds=CHUNK_SECONDS, mode=CHUNKING_MODE, threshold_db=None):
+    if mode == "vad":
+        chunks = vad_chunks(audio, chunk_seconds, threshold_db=threshold_db)
+        kept = speech_ratio(chunks, audio)
+        print_colored(f"Voice activity detection kept {kept:.0%} of the recording in {len(chunks)} chunks", Fore.YELLOW)
+        # A window of a streamed recording may well be silent under the recording's threshold
+        if threshold_db is None and len(audio) and kept < VAD_MIN_SPEECH_RATIO:
+            # Rather transcribe some silence than silently return an empty transcript
+            print_colored(f"Voice activity detection found almost no speech; falling back to fixed {chunk_seconds:.0f}s chunks", Fore.YELLOW)
+            chunks = audio_utils.split_audio(audio, chunk_seconds)
+    else:
+        chunks = audio_utils.split_audio(audio, chunk_seconds)
+    for i, (chunk_start, chunk) in enumerate(chunks):
+        chunk_end = chunk_start + audio_utils.duration_seconds(chunk)
+        print_colored(f"Chunk {i}: Start={chunk_start:.2f}s, End={chunk_end:.2f}s, Duration={chunk_end-chunk_start:.2f}s", Fore.YELLOW)
     return chunks
 
-def transcribe_audio(audio_file):
+def transcribe_audio(audio, offset=0.0, engine=None):
+    """
+    Transcribe a file path or a 16 kHz mono float32 array with the selected engine.
+
+    Segment timestamps are shifted by offset (in seconds) so that chunks of a
+    longer recording line up with the original timeline.
+    """
     try:
-        # Load the Whisper model (using medium model for good balance of accuracy and speed)
-        print_colored("Loading Whisper model...", Fore.CYAN)
-        model = whisper.load_model("medium")
-        
-        # Transcribe the audio file
+        # The engine reuses its warm model from the registry (loaded once per process)
         print_colored("Transcribing audio...", Fore.CYAN)
-        result = model.transcribe(audio_file)
-        
-        # Convert the result to match the expected format
-        # Whisper's result includes timestamps, so we can use those
-        segments = []
-        for segment in result["segments"]:
-            segments.append({
-                "start": segment["start"],
-                "end": segment["end"],
-                "text": segment["text"]
-            })
-        return segments
+        return get_engine(engine).transcribe(audio, offset)
     except Exception as e:
         print_colored(f"Error in transcription: {e}", Fore.RED)
         return None
 
 def load_diarization_pipeline():
+    """
+    Return the process-wide diarization pipeline.
+
+    Raises:
+        DiarizationUnavailable: If it cannot be loaded; the troubleshooting steps are printed first
+    """
     try:
-        print_colored("Attempting to load the diarization pipeline...", Fore.CYAN)
-        pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1",
-                                            use_auth_token=HUGGING_FACE_TOKEN)
-        print_colored("Diarization pipeline loaded successfully.", Fore.GREEN)
-        return pipeline
-    except Exception as e:
+        return get_diarization_pipeline()
+    except DiarizationUnavailable as e:
         print_colored(f"Error loading diarization pipeline: {e}", Fore.RED)
         print_colored("\nTroubleshooting steps:", Fore.YELLOW)
+        if DIARIZATION_OFFLINE:
+            print(f"1. Check that DIARIZATION_MODEL_DIR ({DIARIZATION_MODEL_DIR}) contains the pipeline's config.yaml.")
+            print("2. Check that every model path in config.yaml points to a local file, not a Hugging Face model id.")
+            raise
         print("1. Ensure you have an active internet connection.")
-        print("2. Verify that you've accepted the user conditions at https://huggingface.co/pyannote/speaker-diarization-3.1")
+        print(f"2. Verify that you've accepted the user conditions at https://huggingface.co/{DIARIZATION_MODEL}")
         print("3. Check that your Hugging Face token is correct in the .env file.")
         print("4. Try running 'huggingface-cli login' in your terminal and enter your token when prompted.")
         print("5. If the issue persists, try clearing your Hugging Face cache:")
@@ -131,19 +116,374 @@ def load_diarization_pipeline():
         print("   - On Windows: rmdir /s /q %USERPROFILE%\\.cache\\huggingface")
         print("6. Ensure that you have the latest version of pyannote.audio installed:")
         print("   pip install --upgrade pyannote.audio")
-        sys.exit(1)
+        raise
+
+def transcribe_chunks(chunks, workers=1, threads_per_worker=None, batch_size=1, engine=None, checkpoint_dir=None):
+    """
+    Transcribe (start_seconds, samples) chunks in timestamp order.
+
+    With checkpoint_dir set, each finished chunk is checkpointed there and
+    chunks checkpointed by an earlier, interrupted run are not transcribed again.
+    """
+    completed = {}
+    if checkpoint_dir:
+        for chunk_start, _ in chunks:
+            segments = load_checkpoint(checkpoint_dir, chunk_start)
+            if segments is not None:
+                completed[chunk_start] = segments
+        if completed:
+            print_colored(f"Resuming: {len(completed)}/{len(chunks)} chunks already transcribed", Fore.GREEN)
+    pending = [(chunk_start, chunk) for chunk_start, chunk in chunks if chunk_start not in completed]
+
+    def chunk_done(chunk_start, segments):
+        completed[chunk_start] = segments
+        if checkpoint_dir:
+            save_checkpoint(checkpoint_dir, chunk_start, segments)
+
+    def in_order():
+        return [segment for chunk_start in sorted(completed) for segment in completed[chunk_start]]
+
+    if not pending:
+        return in_order()
+
+    if batch_size > 1:
+        try:
+            print_colored(f"Transcribing {len(pending)} chunks in batches of {batch_size}...", Fore.CYAN)
+            # Decode batch_size chunks at a time so that each batch is checkpointed as it finishes
+            for i in range(0, len(pending), batch_size):
+                group = pending[i:i + batch_size]
+                windows = [(offset, window_offset, samples) for offset, chunk in group
+                           for window_offset, samples in split_windows([(offset, chunk)])]
+                results = transcribe_windows_batched(windows, batch_size)
+                for offset, _ in group:
+                    chunk_done(offset, results.get(offset, []))
+            return in_order()
+        except Exception as e:
+            print_colored(f"Error in batched transcription: {e}", Fore.RED)
+            return None
+
+    if workers > 1 and len(pending) > 1:
+        try:
+            print_colored(f"Transcribing {len(pending)} chunks across {workers} worker processes...", Fore.CYAN)
+            transcribe_chunks_parallel(pending, workers, threads_per_worker, engine, on_chunk_done=chunk_done)
+            return in_order()
+        except Exception as e:
+            print_colored(f"Error in parallel transcription: {e}", Fore.RED)
+            return None
+
+    for i, (chunk_start, chunk) in enumerate(pending):
+        print_colored(f"Transcribing chunk {i + 1}/{len(pending)} (starting at {chunk_start:.2f}s)", Fore.CYAN)
+        transcription = transcribe_audio(chunk, offset=chunk_start, engine=engine)
+        if transcription is None:
+            return None
+        chunk_done(chunk_start, transcription)
+    return in_order()
+
+def chunk_seconds_for(batch_size):
+    # Batched decoding works on single 30-second windows, so cut chunks at pauses within one window
+    return min(CHUNK_SECONDS, WINDOW_SECONDS) if batch_size > 1 else CHUNK_SECONDS
+
+def transcription_cache_key(fingerprint, batch_size=1, engine=None, regions=None):
+    settings = get_engine(engine).settings(chunking=CHUNKING_MODE, chunk_seconds=chunk_seconds_for(batch_size),
+                                           decoder="batched" if batch_size > 1 else "sequential")
+    if CHUNKING_MODE == "vad":
+        settings["vad"] = VAD_VERSION
+    if regions is not None:
+        # Partial transcripts of selected speakers must not be mistaken for the whole recording
+        settings["regions"] = make_key(regions)
+    return make_key(fingerprint, settings)
+
+def pretranscribe_batch(audio_files, batch_size=WHISPER_BATCH_SIZE, engine=TRANSCRIPTION_ENGINE):
+    """
+    Transcribe several files together in shared decode batches.
 
-def transcribe_and_diarize(audio_file, perform_diarization=True):
+    Windows from all files are stacked into the same batches and the
+    per-file transcripts are stored in the transcript cache, where the
+    following transcribe_and_diarize call for each file picks them up.
+    """
+    if not get_engine(engine).supports_batching:
+        return
+    if not TRANSCRIPT_CACHE:
+        print_colored("Cross-file batching needs TRANSCRIPT_CACHE enabled; transcribing files one by one", Fore.YELLOW)
+        return
+    windows = []
+    cache_keys = {}
+    for audio_file in audio_files:
+        try:
+            audio = audio_utils.load_audio(audio_file)
+        except Exception as e:
+            print_colored(f"Error decoding {audio_file}: {e}", Fore.RED)
+            continue
+        fingerprint = audio_utils.audio_fingerprint(audio)
+        # Whole-recording key, as transcribe_file uses when no regions are selected
+        cache_key = transcription_cache_key(fingerprint, batch_size, engine)
+        if cache_get("transcripts", cache_key) is not None:
+            continue
+        cache_keys[audio_file] = cache_key
+        chunks = split_audio(audio, chunk_seconds_for(batch_size))
+        windows.extend((audio_file, offset, samples) for offset, samples in split_windows(chunks))
+    if not windows:
+        return
+
+    print_colored(f"Transcribing {len(windows)} windows from {len(cache_keys)} files in batches of {batch_size}...", Fore.CYAN)
     try:
-        chunks = split_audio(audio_file)
+        results = transcribe_windows_batched(windows, batch_size)
+    except Exception as e:
+        print_colored(f"Error in batched transcription: {e}", Fore.RED)
+        return
+    for audio_file, segments in results.items():
+        cache_put("transcripts", cache_keys[audio_file], segments)
+
+def stream_analysis(audio_file):
+    """
+    Make one streaming pass over a recording for its fingerprint and VAD settings.
+
+    A window of continuous speech would be its own noise floor, so the speech
+    threshold is estimated once from the frame energies of the whole recording.
+
+    Returns:
+        (fingerprint, (threshold_db, chunking mode)) tuple; the mode falls back
+        to "fixed" when almost none of the recording passes the threshold
+    """
+    energies = []
+    fingerprint = audio_utils.stream_fingerprint(audio_file, on_block=lambda block: energies.append(frame_energy_db(block)))
+    energy = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+    threshold_db = speech_threshold_db(energy)
+    mode = CHUNKING_MODE
+    if mode == "vad" and len(energy) and np.mean(energy > threshold_db) < VAD_MIN_SPEECH_RATIO:
+        print_colored("Voice activity detection found almost no speech; falling back to fixed chunks", Fore.YELLOW)
+        mode = "fixed"
+    return fingerprint, (threshold_db, mode)
+
+def stream_chunks(audio_file, window_seconds, chunk_seconds, mode=CHUNKING_MODE, threshold_db=None):
+    """
+    Yield lists of (start_seconds, samples) chunks, one streamed window at a time.
+
+    Only the current window is decoded in memory. A chunk that runs up to the
+    end of a window may continue in the next one, so it is carried over and
+    re-chunked together with the next window instead of being cut mid-word.
+    Pass the recording-wide threshold_db from stream_analysis for VAD chunking.
+    """
+    chunk_seconds = min(chunk_seconds, window_seconds / 2)
+    sample_rate = audio_utils.SAMPLE_RATE
+    carry = None
+    carry_start = 0.0
+    for block in audio_utils.stream_audio(audio_file, window_seconds):
+        window = block if carry is None else np.concatenate((carry, block))
+        window_start = carry_start
+        carry = None
+        chunks = split_audio(window, chunk_seconds, mode, threshold_db)
+        if chunks:
+            last_start, last_samples = chunks[-1]
+            last_start_sample = int(round(last_start * sample_rate))
+            if last_start_sample + len(last_samples) >= len(window):
+                carry = window[last_start_sample:].copy()
+                carry_start = window_start + last_start
+                chunks = chunks[:-1]
+        if carry is None:
+            carry_start = window_start + audio_utils.duration_seconds(window)
+        yield [(window_start + offset, samples) for offset, samples in chunks]
+    if carry is not None:
+        yield [(carry_start + offset, samples) for offset, samples in split_audio(carry, chunk_seconds, mode, threshold_db)]
+
+def transcribe_file(audio_file, workers=TRANSCRIBE_WORKERS, threads_per_worker=TORCH_THREADS_PER_WORKER,
+                    batch_size=WHISPER_BATCH_SIZE, memory_limit_mb=MEMORY_LIMIT_MB, engine=TRANSCRIPTION_ENGINE,
+                    audio=None, fingerprint=None, regions=None, stream_settings=None):
+    """
+    Transcribe a whole recording, reusing the transcript cache when possible.
+
+    With memory_limit_mb set, the recording is streamed and transcribed one
+    window at a time so that memory stays flat however long it is; otherwise
+    it is decoded once into memory (unless the caller passes the decoded
+    audio) and chunked from there. A caller that already hashed the audio
+    passes its fingerprint to save another pass over it (and, when streaming,
+    the (threshold_db, mode) stream_settings from the same stream_analysis),
+    and a caller that only wants part of the recording passes the
+    (start_sample, end_sample) regions to transcribe.
+    """
+    if batch_size > 1 and not get_engine(engine).supports_batching:
+        print_colored(f"The {engine} engine does not support batched decoding; transcribing chunks one by one", Fore.YELLOW)
+        batch_size = 1
+
+    if memory_limit_mb and regions is None:
+        window_seconds = audio_utils.window_seconds_for(memory_limit_mb)
+        # A separate streaming pass computes the cache key and VAD threshold without holding the recording
+        if fingerprint is None or stream_settings is None:
+            fingerprint, stream_settings = stream_analysis(audio_file)
+        cache_key = transcription_cache_key(fingerprint, batch_size, engine)
+        audio = None
+    else:
+        # Decode once; chunks are views into this buffer, so nothing is written to disk
+        if audio is None:
+            audio = audio_utils.load_audio(audio_file)
+        fingerprint = fingerprint or audio_utils.audio_fingerprint(audio)
+        cache_key = transcription_cache_key(fingerprint, batch_size, engine, regions)
+
+    # Reuse the transcript of identical audio decoded with identical settings
+    transcriptions = cache_get("transcripts", cache_key) if TRANSCRIPT_CACHE else None
+    if transcriptions is not None:
+        print_colored(f"Using cached transcription ({len(transcriptions)} segments)", Fore.GREEN)
+        return transcriptions
+
+    # Finished chunks are checkpointed here, keyed like the transcript, so a rerun resumes where this one stopped
+    checkpoint_dir = job_dir(cache_key) if TRANSCRIPT_CHECKPOINTS else None
+
+    if audio is None:
+        print_colored(f"Streaming {audio_file} in {window_seconds:.0f}s windows ({memory_limit_mb} MB audio budget)", Fore.CYAN)
         transcriptions = []
-        
-        for chunk in chunks:
-            print_colored(f"Transcribing chunk: {chunk}", Fore.CYAN)
-            transcription = transcribe_audio(chunk)
-            if transcription is None:
+        threshold_db, mode = stream_settings
+        for chunks in stream_chunks(audio_file, window_seconds, chunk_seconds_for(batch_size), mode, threshold_db):
+            segments = transcribe_chunks(chunks, workers, threads_per_worker, batch_size, engine, checkpoint_dir)
+            if segments is None:
                 return None
-            transcriptions.extend(transcription)
+            transcriptions.extend(segments)
+    else:
+        if regions is not None:
+            chunks = vad_chunks(audio, chunk_seconds_for(batch_size), regions=regions)
+            print_colored(f"Transcribing {speech_ratio(chunks, audio):.0%} of the recording in {len(chunks)} chunks", Fore.YELLOW)
+        else:
+            chunks = split_audio(audio, chunk_seconds_for(batch_size))
+        transcriptions = transcribe_chunks(chunks, workers, threads_per_worker, batch_size, engine, checkpoint_dir)
+        if transcriptions is None:
+            return None
+
+    if TRANSCRIPT_CACHE:
+        cache_put("transcripts", cache_key, transcriptions)
+    if checkpoint_dir:
+        clear_job(checkpoint_dir)
+    return transcriptions
+
+def diarization_cache_key(fingerprint, **params):
+    return make_key(fingerprint, diarization_pipeline_version(), params)
+
+def speaker_hints(num_speakers=NUM_SPEAKERS, min_speakers=MIN_SPEAKERS, max_speakers=MAX_SPEAKERS):
+    """Return the speaker-count arguments for the diarization pipeline, leaving out unset ones"""
+    hints = {"num_speakers": num_speakers, "min_speakers": min_speakers, "max_speakers": max_speakers}
+    return {name: value for name, value in hints.items() if value}
+
+def diarize(audio, fingerprint=None, hints=None):
+    """
+    Run the diarization pipeline over audio, reusing the diarization cache when possible.
+
+    When the waveform is in memory, each turn's speaker embedding is stored
+    too, so that the recording can be re-clustered later without pyannote;
+    a recording that already has stored embeddings is re-clustered for new
+    speaker-count hints instead of being diarized again.
+
+    Args:
+        audio: {"waveform", "sample_rate"} mapping (see audio.pyannote_input), or an audio file
+            path that is decoded with ffmpeg only if the pipeline has to run
+        fingerprint: Content hash of the audio, used as cache key (default: no caching)
+        hints: num_speakers, min_speakers and/or max_speakers for the pipeline (see speaker_hints)
+
+    Returns:
+        List of (start, end, speaker) turns sorted by start
+    """
+    hints = hints or {}
+    cache_key = diarization_cache_key(fingerprint, **hints) if fingerprint and DIARIZATION_CACHE else None
+    turns = cache_get("diarization", cache_key) if cache_key else None
+    if turns is not None:
+        print_colored(f"Using cached diarization ({len(turns)} speaker turns)", Fore.GREEN)
+        return [tuple(turn) for turn in turns]
+
+    stored = load_turn_embeddings(fingerprint) if fingerprint and hints else None
+    if stored is not None:
+        print_colored(f"Re-clustering stored speaker embeddings with {hints}", Fore.MAGENTA)
+        turns = recluster(*stored, **hints)
+    else:
+        diarization_pipeline = load_diarization_pipeline()
+        if isinstance(audio, str):
+            # pyannote holds the whole waveform either way; decoding it here handles any
+            # ffmpeg-readable format and keeps it to 16 kHz mono float32 (~230 MB per hour)
+            audio = audio_utils.pyannote_input(audio_utils.load_audio(audio))
+        print_colored(f"Performing speaker diarization{f' with {hints}' if hints else ''}...", Fore.MAGENTA)
+        # Keep the per-chunk speaker embeddings the pipeline computes before clustering
+        artifacts = {}
+        def hook(step_name, step_artifact, file=None, total=None, completed=None):
+            if completed is None and step_artifact is not None and step_name in ("segmentation", "embeddings"):
+                artifacts[step_name] = step_artifact
+        turns = speaker_turns(diarization_pipeline(audio, hook=hook, **hints))
+        if fingerprint and SPEAKER_EMBEDDINGS and len(artifacts) == 2:
+            try:
+                embeddings = chunk_turn_embeddings(turns, artifacts["segmentation"], artifacts["embeddings"])
+                store_turn_embeddings(fingerprint, turns, embeddings)
+            except Exception as e:
+                print_colored(f"Could not store speaker embeddings: {e}", Fore.YELLOW)
+    if cache_key:
+        cache_put("diarization", cache_key, turns)
+    return turns
+
+_diarization_executor = None
+
+def start_diarization(audio, fingerprint=None, hints=None):
+    """Start diarizing audio on the background diarization thread and return its Future"""
+    global _diarization_executor
+    if _diarization_executor is None:
+        _diarization_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diarization")
+    return _diarization_executor.submit(diarize, audio, fingerprint, hints)
+
+def diarization_thread_budget(diarization_threads=DIARIZATION_THREADS):
+    """Split the cores between diarization in this process and the transcription worker processes"""
+    cores = os.cpu_count() or 1
+    diarization_threads = min(diarization_threads or max(1, cores // 2), max(1, cores - 1))
+    return diarization_threads, max(1, cores - diarization_threads)
+
+def transcribe_and_diarize(audio_file, perform_diarization=True, workers=TRANSCRIBE_WORKERS,
+                           threads_per_worker=TORCH_THREADS_PER_WORKER, batch_size=WHISPER_BATCH_SIZE,
+                           memory_limit_mb=MEMORY_LIMIT_MB, engine=TRANSCRIPTION_ENGINE,
+                           concurrent_diarization=CONCURRENT_DIARIZATION, diarize_first=DIARIZE_FIRST,
+                           hints=None):
+    diarization_future = None
+    previous_threads = None
+    hints = speaker_hints() if hints is None else hints
+    try:
+        # Decode once and share the waveform between Whisper and pyannote. Within a memory
+        # limit only transcription streams: pyannote needs the whole waveform, so diarize()
+        # decodes the file when the pipeline runs, outside the ceiling
+        audio = None if memory_limit_mb else audio_utils.load_audio(audio_file)
+        stream_settings = None
+        if audio is not None:
+            fingerprint = audio_utils.audio_fingerprint(audio)
+        else:
+            fingerprint, stream_settings = stream_analysis(audio_file)
+        if perform_diarization:
+            diarization_input = audio_utils.pyannote_input(audio) if audio is not None else audio_file
+        if perform_diarization and diarize_first and audio is None:
+            print_colored("Diarize-first needs the recording in memory; transcribing all speakers within the memory limit", Fore.YELLOW)
+            diarize_first = False
+
+        turns = None
+        regions = None
+        kept_speakers = None
+        if perform_diarization and diarize_first:
+            # Diarize first and only transcribe the speech of speakers worth analysing
+            turns = name_known_speakers(diarize(diarization_input, fingerprint=fingerprint, hints=hints), fingerprint)
+            kept_speakers = select_speakers(turns, MIN_SPEAKER_SECONDS, EXCLUDE_SPEAKERS)
+            skipped = sorted(set(talk_time(turns)) - kept_speakers)
+            if skipped:
+                print_colored(f"Not transcribing {', '.join(skipped)} (excluded or under {MIN_SPEAKER_SECONDS:.0f}s of speech)", Fore.YELLOW)
+            regions = speaker_regions(turns, kept_speakers)
+            transcriptions = transcribe_file(audio_file, workers, threads_per_worker, batch_size, memory_limit_mb, engine, audio, fingerprint, regions)
+        elif perform_diarization and concurrent_diarization:
+            # Diarize alongside transcription; the two only meet again at speaker assignment.
+            # torch's thread count is per process, so the cores can only be split when
+            # transcription runs in worker processes. Set it before the thread starts
+            if workers > 1:
+                import torch
+                diarization_threads, transcription_threads = diarization_thread_budget()
+                threads_per_worker = threads_per_worker or max(1, transcription_threads // workers)
+                previous_threads = torch.get_num_threads()
+                torch.set_num_threads(diarization_threads)
+                print_colored(f"Diarizing concurrently with {diarization_threads} torch threads "
+                              f"({workers} transcription workers x {threads_per_worker})", Fore.MAGENTA)
+            else:
+                print_colored("Diarizing concurrently; diarization and transcription share this process's torch threads", Fore.MAGENTA)
+            diarization_future = start_diarization(diarization_input, fingerprint, hints)
+            transcriptions = transcribe_file(audio_file, workers, threads_per_worker, batch_size, memory_limit_mb, engine, audio, fingerprint, stream_settings=stream_settings)
+        else:
+            transcriptions = transcribe_file(audio_file, workers, threads_per_worker, batch_size, memory_limit_mb, engine, audio, fingerprint, stream_settings=stream_settings)
+        if transcriptions is None:
+            return None
         
         # Save the transcription before diarization
         save_transcript(transcriptions, audio_file, "before_diarization")
@@ -151,32 +491,25 @@ def transcribe_and_diarize(audio_file, perform_diarization=True):
         if not perform_diarization:
             return {"Speaker 1": " ".join([segment['text'] for segment in transcriptions])}
 
-        diarization_pipeline = load_diarization_pipeline()
-
-        print_colored("Performing speaker diarization...", Fore.MAGENTA)
-        diarization = diarization_pipeline(audio_file)
+        if turns is None:
+            if diarization_future is not None:
+                turns = diarization_future.result()
+                diarization_future = None
+            else:
+                turns = diarize(diarization_input, fingerprint=fingerprint, hints=hints)
+            turns = name_known_speakers(turns, fingerprint)
 
         print_colored("Combining transcription with speaker labels...", Fore.BLUE)
         speaker_transcripts = {}
-        
-        for segment in transcriptions:
-            start_time = segment['start']
-            end_time = segment['end']
-            text = segment['text']
-            
-            # Find the speaker for this segment
-            speaker = None
-            for turn, _, spk in diarization.itertracks(yield_label=True):
-                if turn.start <= start_time < turn.end:
-                    speaker = spk
-                    break
-            
-            if speaker is None:
-                speaker = "Unknown"
-            
+        speakers = assign_speakers(transcriptions, turns)
+
+        for segment, speaker in zip(transcriptions, speakers):
+            # Chunks may bridge short turns of skipped speakers; leave their words out
+            if kept_speakers is not None and speaker not in kept_speakers:
+                continue
             if speaker not in speaker_transcripts:
                 speaker_transcripts[speaker] = []
-            speaker_transcripts[speaker].append(text)
+            speaker_transcripts[speaker].append(segment['text'])
 
         for speaker in speaker_transcripts:
             speaker_transcripts[speaker] = " ".join(speaker_transcripts[speaker])
@@ -188,6 +521,13 @@ def transcribe_and_diarize(audio_file, perform_diarization=True):
     except Exception as e:
         print_colored(f"Error in transcription and diarization: {e}", Fore.RED)
         return None
+    finally:
+        # Transcription failed: drop the diarization if it has not started yet
+        if diarization_future is not None:
+            diarization_future.cancel()
+        if previous_threads is not None:
+            import torch
+            torch.set_num_threads(previous_threads)
 
 def save_transcript(transcript, audio_file, stage):
     try:
@@ -224,24 +564,27 @@ def read_competency_definitions(file_path):
         print_colored(f"Error reading competency definitions: {e}", Fore.RED)
         return None
 
-def extract_competency_insights(transcript, competency_definitions):
+def competency_response_json(content):
+    """Return the insights JSON object in a model reply; raise ValueError if it is missing or incomplete"""
+    json_start = content.find('{')
+    json_end = content.rfind('}') + 1
+    if json_start == -1 or json_end == 0:
+        raise ValueError("No JSON object found in response")
+    parsed_data = json.loads(content[json_start:json_end])
+    if 'competencies' not in parsed_data or 'overall_assessment' not in parsed_data:
+        raise ValueError("Missing required data structure")
+    return parsed_data
+
+def extract_competency_insights(transcript, competency_definitions, cache=LLM_CACHE, cache_only=False):
     try:
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "HTTP-Referer": SITE_URL,
-            "X-Title": SITE_NAME,
-            "Content-Type": "application/json"
-        }
-        
-        prompt = f"""
-        Analyze the following transcript and extract insights about student competency development based on the provided competency definitions and reporting dimensions. Generate a JSON object that includes an analysis for EACH of the competencies in the competency definitions text. Focus on identifying evidence of competency development across reporting dimensions, and specific examples from the transcript that demonstrate competency-related behaviors or knowledge.
+        # Everything but the transcript is identical for every speaker of a batch, so it goes
+        # first as one system block that providers with prompt caching can reuse
+        system_prompt = f"""
+        Analyze the transcript you are given and extract insights about student competency development based on the provided competency definitions and reporting dimensions. Generate a JSON object that includes an analysis for EACH of the competencies in the competency definitions text. Focus on identifying evidence of competency development across reporting dimensions, and specific examples from the transcript that demonstrate competency-related behaviors or knowledge.
 
         Competency Definitions:
         {competency_definitions}
 
-        Transcript:
-        {transcript}
-
         Please provide a structured JSON object with the following format for each competency:
         {{
             "competencies": [
@@ -278,17 +621,14 @@ def extract_competency_insights(transcript, competency_definitions):
         5. Choose specific numbers within these ranges based on the strength of evidence
         """
         
-        data = {
-            "model": OPENROUTER_MODEL,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        }
+        messages = [
+            {"role": "system", "content": [prompt_cache_block(system_prompt)]},
+            {"role": "user", "content": f"Transcript:\n{transcript}"}
+        ]
 
         print_colored("Extracting competency insights...", Fore.CYAN)
-        response = requests.post(OPENROUTER_URL, headers=headers, json=data)
-        response.raise_for_status()
-        response_json = response.json()
+        # Only replies that parse are cached, so a malformed one is not replayed
+        response_json = chat_completion(messages, cache=cache, cache_only=cache_only, validate=competency_response_json)
 
         content = response_json['choices'][0]['message']['content'].strip()
         
@@ -347,6 +687,40 @@ def extract_competency_insights(transcript, competency_definitions):
             "overall_assessment": f"Error in analysis: {str(e)}"
         }
 
+def extract_speaker_insights(speaker_transcripts, competency_definitions, max_concurrency=LLM_MAX_CONCURRENCY, on_start=None,
+                             cache=LLM_CACHE, cache_only=False):
+    """
+    Extract competency insights for every speaker, with up to max_concurrency LLM requests in flight.
+
+    A lone undiarized "Speaker 1" is reported as "Single Speaker". Results come
+    back in the order of speaker_transcripts, so reports match a sequential run.
+
+    Args:
+        speaker_transcripts: Dictionary of speaker -> transcript text
+        competency_definitions: Competency definitions text
+        max_concurrency: Maximum number of speakers analyzed at once
+        on_start: Optional callback(speaker) called as each speaker's analysis begins
+        cache: Reuse and store cached LLM responses
+        cache_only: Only replay cached LLM responses
+
+    Returns:
+        Dictionary of speaker -> competency insights
+    """
+    if len(speaker_transcripts) == 1 and "Speaker 1" in speaker_transcripts:
+        speaker_transcripts = {"Single Speaker": speaker_transcripts["Speaker 1"]}
+
+    def analyze(item):
+        speaker, transcript = item
+        if on_start:
+            on_start(speaker)
+        return extract_competency_insights(transcript, competency_definitions, cache=cache, cache_only=cache_only)
+
+    workers = max(1, min(max_concurrency, len(speaker_transcripts)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map yields results in submission order regardless of completion order
+        insights = list(executor.map(analyze, speaker_transcripts.items()))
+    return dict(zip(speaker_transcripts, insights))
+
 def generate_structured_json(competency_data, audio_filename=None, person_id=1):
     """
     Generate a structured JSON output from the competency data.
@@ -517,15 +891,11 @@ def main():
         print_colored(f"Error: The sound file In the Zone.mp3 does not exist.", Fore.RED)
         return
 
-    wav_file = convert_to_wav(audio_file)
-    if wav_file is None:
-        return
-
     print_colored(f"{'[INIT]':=^40}", Fore.CYAN)
     print_colored("Transcribing audio..." + (" and performing diarization..." if perform_diarization else ""), Fore.CYAN)
     print_colored(f"{'[PROCESSING]':=^40}", Fore.CYAN)
     
-    speaker_transcripts = transcribe_and_diarize(wav_file, perform_diarization)
+    speaker_transcripts = transcribe_and_diarize(audio_file, perform_diarization)
     if speaker_transcripts is None:
         stop_background_music()
         return
@@ -536,18 +906,10 @@ def main():
         stop_background_music()
         return
 
-    competency_data = {}
-
-    # Handle both single and multiple speaker scenarios
-    if len(speaker_transcripts) == 1 and "Speaker 1" in speaker_transcripts:
-        speaker = "Single Speaker"
-        transcript = speaker_transcripts["Speaker 1"]
-        print_colored(f"Extracting competency insights for {speaker}...", Fore.CYAN)
-        competency_data[speaker] = extract_competency_insights(transcript, competency_definitions)
-    else:
-        for speaker, transcript in speaker_transcripts.items():
-            print_colored(f"Extracting competency insights for {speaker}...", Fore.CYAN)
-            competency_data[speaker] = extract_competency_insights(transcript, competency_definitions)
+    competency_data = extract_speaker_insights(
+        speaker_transcripts, competency_definitions,
+        on_start=lambda speaker: print_colored(f"Extracting competency insights for {speaker}...", Fore.CYAN)
+    )
 
     print_colored("Generating combined report...", Fore.CYAN)
     combined_report = generate_combined_report(competency_data)
@@ -0,0 +1,336 @@
+# Model registry for ZoneSight
+# Keeps heavyweight models warm for the life of the process so that every
+# chunk, file and batch shares one copy of the weights instead of reloading it.
+
+import functools
+import os
+import threading
+import time
+from colorama import Fore, Style
+from config import (
+    WHISPER_MODEL, WHISPER_DEVICE, WHISPER_PRECISION, CACHE_DIR,
+    DIARIZATION_MODEL, DIARIZATION_MODEL_DIR, DIARIZATION_OFFLINE, HUGGING_FACE_TOKEN
+)
+
+# fp16 needs a GPU; int8 (dynamically quantized linear layers) and bf16 (autocast) are CPU modes
+SUPPORTED_PRECISIONS = ("fp32", "fp16", "int8", "bf16")
+CPU_PRECISIONS = ("int8", "bf16")
+
+_models = {}
+_model_stats = {}
+_registry_lock = threading.Lock()
+# One lock per registry key, so loading Whisper does not hold up loading the diarization pipeline
+_load_locks = {}
+
+def _load_lock(key):
+    """Return the lock that serializes loading one registry entry"""
+    with _registry_lock:
+        return _load_locks.setdefault(key, threading.Lock())
+
+def resolve_device(device=None):
+    """Return the torch device name to load models on"""
+    device = device or WHISPER_DEVICE
+    if device:
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def resident_memory_mb():
+    """Return the current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Not Linux: fall back to the peak RSS reported by the kernel
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def model_size_mb(model):
+    """Return the in-memory size of a torch model's weights in MB, including quantized packed weights"""
+    import torch
+
+    def tensor_bytes(value):
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(v) for v in value)
+        return 0
+
+    return sum(tensor_bytes(v) for v in model.state_dict().values()) / (1024 * 1024)
+
+def cpu_supports_bf16():
+    """Check whether the CPU has native bfloat16 instructions (AVX-512 BF16 or AMX)"""
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            flags = cpuinfo.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+@functools.lru_cache(maxsize=None)
+def resolve_precision(precision=None, device=None):
+    """Validate a precision for a device, falling back from bf16 to fp32 on CPUs without bf16 support"""
+    precision = precision or WHISPER_PRECISION
+    device = resolve_device(device)
+    if precision not in SUPPORTED_PRECISIONS:
+        raise ValueError(f"Unsupported Whisper precision '{precision}', expected one of {SUPPORTED_PRECISIONS}")
+    if precision in CPU_PRECISIONS and device != "cpu":
+        raise ValueError(f"Whisper precision '{precision}' is only available on cpu, not {device}")
+    if precision == "bf16" and not cpu_supports_bf16():
+        print(f"{Fore.YELLOW}This CPU has no native bfloat16 support; using fp32 instead{Style.RESET_ALL}")
+        return "fp32"
+    return precision
+
+def inference_context(precision=None):
+    """Return the context manager that Whisper calls should run under for a precision"""
+    import contextlib
+    import torch
+    if resolve_precision(precision) == "bf16":
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+def _quantized_model_path(name):
+    import torch
+    return os.path.join(CACHE_DIR, "models", f"whisper-{name}-int8-torch{torch.__version__}.pt")
+
+def _load_int8_model(name):
+    """
+    Return Whisper with int8 dynamically quantized linear layers.
+
+    The converted model is pickled under CACHE_DIR/models so that the
+    conversion only runs once per model and torch version.
+    """
+    import torch
+    import whisper
+
+    path = _quantized_model_path(name)
+    if os.path.exists(path):
+        # A pickled module rather than a state dict; the file is one we wrote ourselves
+        return torch.load(path, map_location="cpu", weights_only=False)
+
+    model = whisper.load_model(name, device="cpu")
+    # Whisper's Linear subclass is not recognised by quantize_dynamic, so swap in plain nn.Linear first
+    for module in list(model.modules()):
+        for child_name, child in module.named_children():
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                plain.weight = child.weight
+                plain.bias = child.bias
+                setattr(module, child_name, plain)
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"{Fore.GREEN}Saved int8 Whisper model to {path}{Style.RESET_ALL}")
+    return model
+
+def get_whisper_model(name=None, device=None, precision=None):
+    """
+    Return a warm Whisper model, loading it on first use.
+
+    Models are keyed by (name, device, precision) and stay loaded until the
+    process exits, so repeated calls for chunks and batch files are free.
+
+    Args:
+        name: Whisper model name (default: WHISPER_MODEL from config)
+        device: Torch device (default: WHISPER_DEVICE, or cuda when available)
+        precision: Weight precision, one of SUPPORTED_PRECISIONS
+
+    Returns:
+        The loaded whisper model
+    """
+    name = name or WHISPER_MODEL
+    device = resolve_device(device)
+    precision = precision or WHISPER_PRECISION
+    precision = resolve_precision(precision, device)
+
+    key = ("whisper", name, device, precision)
+    with _load_lock(key):
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        # Imported here so that processes which only talk to the daemon never load torch
+        import whisper
+        print(f"{Fore.CYAN}Loading Whisper model '{name}' on {device} ({precision})...{Style.RESET_ALL}")
+        rss_before = resident_memory_mb()
+        start_time = time.time()
+        if precision == "int8":
+            model = _load_int8_model(name)
+        else:
+            model = whisper.load_model(name, device=device)
+        if precision == "fp16":
+            model = model.half()
+        elif precision == "bf16":
+            # Weights stay fp32 and matmuls run in bf16 under autocast (see inference_context);
+            # Whisper's decoder expects fp32 audio features, so cast the encoder output back
+            model.encoder.register_forward_hook(lambda module, inputs, output: output.float())
+        load_seconds = time.time() - start_time
+        weights_mb = model_size_mb(model)
+
+        with _registry_lock:
+            _models[key] = model
+            _model_stats[key] = {
+                "engine": "whisper",
+                "name": name,
+                "device": device,
+                "precision": precision,
+                "load_seconds": load_seconds,
+                "weights_mb": weights_mb,
+                "rss_delta_mb": resident_memory_mb() - rss_before,
+            }
+        print(f"{Fore.GREEN}{format_model_stats(_model_stats[key])}{Style.RESET_ALL}")
+        return model
+
+# CTranslate2 compute types matching the Whisper precisions
+CT2_COMPUTE_TYPES = {"fp32": "float32", "fp16": "float16", "int8": "int8", "bf16": "bfloat16"}
+
+def get_faster_whisper_model(name=None, device=None, precision=None):
+    """
+    Return a warm faster-whisper (CTranslate2) model, loading it on first use.
+
+    Shares the registry and statistics with get_whisper_model. CTranslate2
+    quantizes int8 weights at load time, so no converted copy is cached.
+    """
+    name = name or WHISPER_MODEL
+    device = device or WHISPER_DEVICE or "auto"
+    precision = precision or WHISPER_PRECISION
+    if precision not in CT2_COMPUTE_TYPES:
+        raise ValueError(f"Unsupported precision '{precision}', expected one of {tuple(CT2_COMPUTE_TYPES)}")
+
+    key = ("faster-whisper", name, device, precision)
+    with _load_lock(key):
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("The faster-whisper engine needs the faster-whisper package: pip install faster-whisper") from e
+        print(f"{Fore.CYAN}Loading faster-whisper model '{name}' on {device} ({precision})...{Style.RESET_ALL}")
+        rss_before = resident_memory_mb()
+        start_time = time.time()
+        model = WhisperModel(name, device=device, compute_type=CT2_COMPUTE_TYPES[precision])
+        load_seconds = time.time() - start_time
+
+        with _registry_lock:
+            _models[key] = model
+            _model_stats[key] = {
+                "engine": "faster-whisper",
+                "name": name,
+                "device": device,
+                "precision": precision,
+                "load_seconds": load_seconds,
+                "weights_mb": None,  # CTranslate2 weights live outside torch and cannot be measured directly
+                "rss_delta_mb": resident_memory_mb() - rss_before,
+            }
+        print(f"{Fore.GREEN}{format_model_stats(_model_stats[key])}{Style.RESET_ALL}")
+        return model
+
+class DiarizationUnavailable(RuntimeError):
+    """Raised when the diarization pipeline cannot be loaded"""
+
+def diarization_source():
+    """Return where the diarization pipeline is loaded from: the pinned directory or the hub model"""
+    return DIARIZATION_MODEL_DIR or DIARIZATION_MODEL
+
+def diarization_pipeline_version(source=None):
+    """Identify the pipeline and pyannote release that produce diarizations, for cache keys"""
+    from importlib import metadata
+    try:
+        version = metadata.version("pyannote.audio")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    return f"{source or diarization_source()}@pyannote.audio-{version}"
+
+def get_diarization_pipeline(source=None, offline=None):
+    """
+    Return a warm pyannote diarization pipeline, loading it on first use.
+
+    Pipelines are cached for the life of the process, so a batch pays for the
+    hub lookup and model build once rather than once per file.
+
+    Args:
+        source: Hub model id, or a local directory holding config.yaml (default: diarization_source())
+        offline: Refuse any network access and require a local source (default: DIARIZATION_OFFLINE)
+
+    Returns:
+        The loaded pyannote Pipeline
+
+    Raises:
+        DiarizationUnavailable: If the pipeline cannot be loaded
+    """
+    source = source or diarization_source()
+    offline = DIARIZATION_OFFLINE if offline is None else offline
+    local = os.path.exists(source)
+    if offline:
+        if not local:
+            raise DiarizationUnavailable(
+                f"Offline diarization needs a local pipeline directory, but '{source}' does not exist "
+                "(set DIARIZATION_MODEL_DIR)")
+        # Must be set before huggingface_hub is imported for the first time
+        os.environ["HF_HUB_OFFLINE"] = "1"
+
+    key = ("diarization", source)
+    with _load_lock(key):
+        pipeline = _models.get(key)
+        if pipeline is not None:
+            return pipeline
+
+        print(f"{Fore.CYAN}Loading diarization pipeline '{source}'...{Style.RESET_ALL}")
+        rss_before = resident_memory_mb()
+        start_time = time.time()
+        try:
+            # pyannote pulls in torch; import it only when diarization is actually needed
+            from pyannote.audio import Pipeline
+            if local:
+                path = os.path.join(source, "config.yaml") if os.path.isdir(source) else source
+                pipeline = Pipeline.from_pretrained(path)
+            else:
+                pipeline = Pipeline.from_pretrained(source, use_auth_token=HUGGING_FACE_TOKEN)
+        except Exception as e:
+            raise DiarizationUnavailable(f"Could not load diarization pipeline '{source}': {e}") from e
+        if pipeline is None:
+            # pyannote returns None instead of raising when a gated model is not accessible
+            raise DiarizationUnavailable(
+                f"Could not load diarization pipeline '{source}': check HUGGING_FACE_TOKEN and the model's user conditions")
+        load_seconds = time.time() - start_time
+
+        with _registry_lock:
+            _models[key] = pipeline
+            _model_stats[key] = {
+                "engine": "pyannote",
+                "name": source,
+                "device": "cpu",
+                "precision": "fp32",
+                "load_seconds": load_seconds,
+                "weights_mb": None,
+                "rss_delta_mb": resident_memory_mb() - rss_before,
+            }
+        print(f"{Fore.GREEN}{format_model_stats(_model_stats[key])}{Style.RESET_ALL}")
+        return pipeline
+
+def format_model_stats(stats):
+    """Format one registry entry as a single log line"""
+    weights = f", {stats['weights_mb']:.0f} MB weights" if stats["weights_mb"] is not None else ""
+    return (f"{stats['engine']} model '{stats['name']}' on {stats['device']} ({stats['precision']}): "
+            f"loaded in {stats['load_seconds']:.1f}s{weights}, "
+            f"+{stats['rss_delta_mb']:.0f} MB resident")
+
+def model_stats():
+    """Return load statistics for every model currently held by the registry"""
+    with _registry_lock:
+        return [dict(stats) for stats in _model_stats.values()]
+
+def clear_models():
+    """Drop every cached model (Whisper and diarization) so its memory can be reclaimed"""
+    with _registry_lock:
+        _models.clear()
+        _model_stats.clear()
@@ -8,6 +8,8 @@ import json
 import time
 from datetime import datetime
 from portfolio.config import PDF_HOST, raw_portfolio_paths
+from llm_client import chat_completion, prompt_cache_block
+from config import LLM_CACHE
 
 def generate_content_from_url_and_paths(url, paths):
     """Generate PDF content from a URL and a list of paths"""
@@ -52,8 +54,9 @@ def get_portfolio_paths(student):
 
     return list(filter(lambda x: not any(s in x for s in remove), raw_portfolio_paths))
 
-def analyze_portfolio(source_url, paths, competency_definitions, openrouter_api_key, openrouter_url, openrouter_model):
-    """Analyze a portfolio and return the results"""
+def analyze_portfolio(source_url, paths, competency_definitions, openrouter_api_key, openrouter_url, openrouter_model,
+                      cache=LLM_CACHE, cache_only=False):
+    """Analyze a portfolio and return the results (cache/cache_only control LLM response caching)"""
     from portfolio.prompt import generate_prompt
     
     try:
@@ -86,7 +89,7 @@ def analyze_portfolio(source_url, paths, competency_definitions, openrouter_api_
         
         # Include the student content in the message to the LLM
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": [prompt_cache_block(system_prompt)]},
             {"role": "user", "content": [
                 *student_content,  # Include the PDF content directly
                 {
@@ -100,34 +103,23 @@ def analyze_portfolio(source_url, paths, competency_definitions, openrouter_api_
         # The LLM should be able to process the PDF content if it supports the document type
         
         print(f"Querying OpenRouter API using model: {openrouter_model}")
-        headers = {
-            "Authorization": f"Bearer {openrouter_api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://zonesight.app"  # Replace with your actual site
-        }
-        
-        payload = {
-            "model": openrouter_model,
-            "messages": messages,
-            "temperature": 0.2,
-            "max_tokens": 5000
-        }
-        
         api_start_time = time.time()
         print("Sending request to OpenRouter API...")
-        response = requests.post(
-            openrouter_url,
-            headers=headers,
-            json=payload
+        result = chat_completion(
+            messages,
+            model=openrouter_model,
+            url=openrouter_url,
+            api_key=openrouter_api_key,
+            temperature=0.2,
+            max_tokens=5000,
+            cache=cache,
+            cache_only=cache_only,
+            validate=json.loads
         )
         
-        if response.status_code != 200:
-            raise Exception(f"API request failed with status code {response.status_code}: {response.text}")
-        
         api_duration = time.time() - api_start_time
         print(f"API request completed in {api_duration:.2f} seconds")
             
-        result = response.json()
         analysis_text = result["choices"][0]["message"]["content"]
         
         print("Response received, parsing competency analysis...")
@@ -0,0 +1,85 @@
+# Speaker assignment for ZoneSight
+# Matches transcript segments to diarization turns with a sweep line over
+# both sorted lists, so long recordings with thousands of turns stay fast,
+# and selects the speakers whose speech is worth transcribing.
+
+import heapq
+from audio import SAMPLE_RATE
+
+UNKNOWN_SPEAKER = "Unknown"
+
+def speaker_turns(diarization):
+    """Return the (start, end, speaker) turns of a pyannote annotation, sorted by start"""
+    return sorted((turn.start, turn.end, speaker) for turn, _, speaker in diarization.itertracks(yield_label=True))
+
+def assign_speakers(segments, turns):
+    """
+    Pick a speaker for every transcript segment by maximum overlap.
+
+    Segments and turns are swept in start order while a heap keyed on turn
+    end holds the turns still open, so each segment only looks at the turns
+    that can overlap it: O((n + m) log m) rather than O(n * m). A speaker's
+    overlap is summed over all of their turns within the segment.
+
+    Args:
+        segments: List of {"start", "end", ...} segment dictionaries
+        turns: List of (start, end, speaker) tuples, as from speaker_turns
+
+    Returns:
+        List of speaker labels aligned with segments; UNKNOWN_SPEAKER where no turn overlaps
+    """
+    turns = sorted(turns)
+    order = sorted(range(len(segments)), key=lambda i: segments[i]["start"])
+    speakers = [UNKNOWN_SPEAKER] * len(segments)
+    open_turns = []
+    next_turn = 0
+    for i in order:
+        start, end = segments[i]["start"], segments[i]["end"]
+        # Open every turn that starts before this segment ends
+        while next_turn < len(turns) and turns[next_turn][0] < end:
+            turn_start, turn_end, speaker = turns[next_turn]
+            heapq.heappush(open_turns, (turn_end, turn_start, next_turn, speaker))
+            next_turn += 1
+        # Segments arrive in start order, so turns ending before this one starts are done for good
+        while open_turns and open_turns[0][0] <= start:
+            heapq.heappop(open_turns)
+
+        overlaps = {}
+        for turn_end, turn_start, index, speaker in open_turns:
+            overlap = min(end, turn_end) - max(start, turn_start)
+            if overlap > 0:
+                overlaps[speaker] = overlaps.get(speaker, 0.0) + overlap
+        if overlaps:
+            speakers[i] = max(overlaps, key=overlaps.get)
+        elif end <= start:
+            # Zero-length segments have no overlap; fall back to the turn containing their start
+            for turn_end, turn_start, index, speaker in open_turns:
+                if turn_start <= start < turn_end:
+                    speakers[i] = speaker
+                    break
+    return speakers
+
+def talk_time(turns):
+    """Return {speaker: total seconds of speech}"""
+    seconds = {}
+    for start, end, speaker in turns:
+        seconds[speaker] = seconds.get(speaker, 0.0) + end - start
+    return seconds
+
+def select_speakers(turns, min_seconds=0.0, exclude=()):
+    """Return the set of speakers with at least min_seconds of talk time that are not in exclude"""
+    return {speaker for speaker, seconds in talk_time(turns).items()
+            if seconds >= min_seconds and speaker not in exclude}
+
+def speaker_regions(turns, speakers, sample_rate=SAMPLE_RATE):
+    """Return the merged (start_sample, end_sample) spans in which any of speakers is talking"""
+    regions = []
+    for start, end, speaker in sorted(turns):
+        if speaker not in speakers:
+            continue
+        start, end = int(start * sample_rate), int(end * sample_rate)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+    return regions
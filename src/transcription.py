@@ -0,0 +1,119 @@
+# Whisper transcription helpers for ZoneSight
+# Kept free of UI and diarization imports so that worker processes and
+# benchmarks can transcribe audio without pulling in the rest of the app.
+
+from config import WHISPER_MODEL, WHISPER_PRECISION
+from models import get_whisper_model, inference_context
+from audio import SAMPLE_RATE
+
+# Whisper decodes fixed 30-second windows with timestamps in 20 ms steps
+WINDOW_SECONDS = 30
+TIMESTAMP_STEP = 0.02
+
+def decode_settings(**extra):
+    """Return the settings that determine a transcript, for use in cache keys"""
+    return {"model": WHISPER_MODEL, "precision": WHISPER_PRECISION, **extra}
+
+def transcribe_segments(audio, offset=0.0, model=None):
+    """
+    Transcribe a file path or a 16 kHz mono float32 array.
+
+    Args:
+        audio: Path to an audio file, or samples from audio.load_audio
+        offset: Seconds added to every timestamp (the chunk's start in the recording)
+        model: Whisper model to use (default: the registry's warm model)
+
+    Returns:
+        List of {"start", "end", "text"} segment dictionaries
+    """
+    model = model or get_whisper_model()
+    with inference_context():
+        result = model.transcribe(audio, fp16=(WHISPER_PRECISION == "fp16"))
+    return [{
+        "start": segment["start"] + offset,
+        "end": segment["end"] + offset,
+        "text": segment["text"]
+    } for segment in result["segments"]]
+
+def split_windows(chunks, window_seconds=WINDOW_SECONDS, sample_rate=SAMPLE_RATE):
+    """Split (start_seconds, samples) chunks into views no longer than one Whisper window"""
+    window = int(window_seconds * sample_rate)
+    return [(offset + start / sample_rate, samples[start:start + window])
+            for offset, samples in chunks
+            for start in range(0, len(samples), window)]
+
+def _parse_timestamped_tokens(tokens, tokenizer, offset, duration):
+    """Turn a decoded token sequence with timestamp tokens into segments"""
+    segments = []
+    start = None
+    text_tokens = []
+    for token in tokens:
+        if token < tokenizer.timestamp_begin:
+            text_tokens.append(token)
+            continue
+        time = (token - tokenizer.timestamp_begin) * TIMESTAMP_STEP
+        if start is not None and text_tokens:
+            segments.append((start, time, text_tokens))
+            start, text_tokens = None, []
+        else:
+            start = time
+    if text_tokens:
+        # The window ended mid-segment: close it at the end of the audio
+        segments.append((start or 0.0, duration, text_tokens))
+    return [{
+        "start": offset + seg_start,
+        "end": offset + min(seg_end, duration),
+        "text": tokenizer.decode(seg_tokens)
+    } for seg_start, seg_end, seg_tokens in segments]
+
+def transcribe_windows_batched(windows, batch_size, model=None, no_speech_threshold=0.6, logprob_threshold=-1.0):
+    """
+    Decode many Whisper windows together, batch_size at a time.
+
+    Log-mel spectrograms of several windows (from one recording or from many)
+    are stacked into one tensor and decoded in a single model.decode call,
+    which keeps the matrix multiplications busy on large CPU nodes.
+
+    Args:
+        windows: List of (source, start_seconds, samples) with at most 30 s of samples each;
+            source is any hashable label, e.g. the file the window came from
+        batch_size: Number of windows decoded per call
+        model: Whisper model to use (default: the registry's warm model)
+        no_speech_threshold: Windows Whisper considers silent above this probability are dropped...
+        logprob_threshold: ...unless their average log-probability is above this value
+
+    Returns:
+        Dictionary mapping each source to its segments in timestamp order
+    """
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    model = model or get_whisper_model()
+    fp16 = WHISPER_PRECISION == "fp16"
+    options = whisper.DecodingOptions(task="transcribe", without_timestamps=False, fp16=fp16)
+
+    results = {source: [] for source, _, _ in windows}
+    for batch_start in range(0, len(windows), batch_size):
+        batch = windows[batch_start:batch_start + batch_size]
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(samples)), model.dims.n_mels)
+            for _, _, samples in batch
+        ]).to(model.device)
+        if fp16:
+            mel = mel.half()
+
+        with torch.no_grad(), inference_context():
+            decoded = model.decode(mel, options)
+
+        for (source, offset, samples), result in zip(batch, decoded):
+            if result.no_speech_prob > no_speech_threshold and result.avg_logprob < logprob_threshold:
+                continue
+            tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                      language=result.language, task="transcribe")
+            results[source].extend(_parse_timestamped_tokens(
+                result.tokens, tokenizer, offset, len(samples) / SAMPLE_RATE))
+
+    for segments in results.values():
+        segments.sort(key=lambda segment: segment["start"])
+    return results
@@ -0,0 +1,96 @@
+# Parallel chunk transcription for ZoneSight
+# A process pool whose workers each keep one warm Whisper model, so that the
+# chunks of a long recording are transcribed on several cores at once.
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from colorama import Fore, Style
+from config import TRANSCRIPTION_ENGINE
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+# Set in each worker process by _init_worker
+_worker_engine = None
+
+def default_threads_per_worker(workers):
+    """Split the machine's cores evenly between workers so torch does not oversubscribe them"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def _init_worker(torch_threads, engine_name):
+    import torch
+    from engines import get_engine
+    global _worker_engine
+    torch.set_num_threads(torch_threads)
+    # Load the model up front so the first chunk does not pay for it
+    _worker_engine = get_engine(engine_name)
+    _worker_engine.load()
+
+def _transcribe_chunk(task):
+    index, offset, samples = task
+    return index, _worker_engine.transcribe(samples, offset)
+
+def get_transcription_pool(workers, threads_per_worker=None, engine_name=None):
+    """
+    Return the process-wide transcription pool, starting it on first use.
+
+    The pool is kept alive between files so that its workers' models stay
+    warm for a whole batch. Asking for a different size restarts it.
+    """
+    global _pool, _pool_key
+    threads_per_worker = threads_per_worker or default_threads_per_worker(workers)
+    engine_name = engine_name or TRANSCRIPTION_ENGINE
+    key = (workers, threads_per_worker, engine_name)
+    with _pool_lock:
+        if _pool is not None and _pool_key == key:
+            return _pool
+        if _pool is not None:
+            _pool.shutdown()
+        print(f"{Fore.CYAN}Starting {workers} transcription workers with {threads_per_worker} torch threads each...{Style.RESET_ALL}")
+        # Spawn rather than fork: forking a process that already holds torch thread pools can deadlock
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads_per_worker, engine_name)
+        )
+        _pool_key = key
+        return _pool
+
+def shutdown_transcription_pool():
+    """Stop the worker processes and release their models"""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+        _pool_key = None
+
+atexit.register(shutdown_transcription_pool)
+
+def transcribe_chunks_parallel(chunks, workers, threads_per_worker=None, engine_name=None, on_chunk_done=None):
+    """
+    Transcribe (start_seconds, samples) chunks across a pool of worker processes.
+
+    Workers take chunks as they become free; the returned segments are
+    reassembled in timestamp order regardless of which worker finished first.
+    on_chunk_done(start_seconds, segments) is called as each chunk finishes.
+
+    Returns:
+        List of {"start", "end", "text"} segment dictionaries
+    """
+    pool = get_transcription_pool(workers, threads_per_worker, engine_name)
+    futures = [pool.submit(_transcribe_chunk, (i, offset, samples)) for i, (offset, samples) in enumerate(chunks)]
+    results = {}
+    for future in as_completed(futures):
+        index, segments = future.result()
+        results[index] = segments
+        if on_chunk_done:
+            on_chunk_done(chunks[index][0], segments)
+        print(f"{Fore.CYAN}Transcribed chunk {len(results)}/{len(futures)}{Style.RESET_ALL}")
+    segments = [segment for i in sorted(results) for segment in results[i]]
+    return sorted(segments, key=lambda segment: segment["start"])
@@ -0,0 +1,148 @@
+# Voice activity detection for ZoneSight
+# Energy-based speech detection used to cut recordings on pauses and to skip
+# silence before it reaches the Whisper decoder.
+
+import numpy as np
+from audio import SAMPLE_RATE
+
+FRAME_SECONDS = 0.03
+# The noise floor is a low percentile of frame energy, so that a recording
+# needs only a few percent of pauses for it to land on background noise
+NOISE_FLOOR_PERCENTILE = 2
+SPEECH_LEVEL_PERCENTILE = 90
+# Stationary noise varies by a dB or two; stay above that even without contrast
+MIN_MARGIN_DB = 3.0
+# Bump when speech detection changes, so transcripts cached with the old chunks are not reused
+VAD_VERSION = 2
+
+def frame_energy_db(audio, sample_rate=SAMPLE_RATE, frame_seconds=FRAME_SECONDS):
+    """Return the RMS energy in dBFS of consecutive non-overlapping frames"""
+    frame_samples = int(frame_seconds * sample_rate)
+    n_frames = len(audio) // frame_samples
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:n_frames * frame_samples].reshape(n_frames, frame_samples)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def speech_threshold_db(energy, margin_db=12.0):
+    """
+    Return an adaptive speech threshold in dBFS for an array of frame energies.
+
+    The threshold sits margin_db above the noise floor, but no higher than
+    halfway to the typical speech level, so that speech only a few dB above
+    room noise still passes.
+    """
+    if len(energy) == 0:
+        return -60.0
+    noise_floor, speech_level = np.percentile(energy, [NOISE_FLOOR_PERCENTILE, SPEECH_LEVEL_PERCENTILE])
+    margin = min(margin_db, max(MIN_MARGIN_DB, (speech_level - noise_floor) / 2))
+    return max(noise_floor + margin, -60.0)
+
+def detect_speech_regions(audio, sample_rate=SAMPLE_RATE, threshold_db=None, margin_db=12.0,
+                          min_silence_seconds=0.5, min_speech_seconds=0.25, padding_seconds=0.2):
+    """
+    Find the speech regions of a decoded buffer.
+
+    A frame counts as speech when its energy is above speech_threshold_db of
+    the buffer (or above threshold_db when given). Pauses shorter than
+    min_silence_seconds are bridged, blips shorter than min_speech_seconds are
+    dropped, and each region is padded so that word onsets are not clipped.
+
+    Args:
+        audio: 1-D float32 array from audio.load_audio
+        sample_rate: Sample rate of the buffer
+        threshold_db: Absolute speech threshold in dBFS (default: adaptive)
+        margin_db: Largest margin above the noise floor for the adaptive threshold
+        min_silence_seconds: Shortest pause that separates two regions
+        min_speech_seconds: Shortest region that is kept
+        padding_seconds: Context kept on both sides of each region
+
+    Returns:
+        List of (start_sample, end_sample) tuples in ascending order
+    """
+    energy = frame_energy_db(audio, sample_rate)
+    if len(energy) == 0:
+        return []
+
+    if threshold_db is None:
+        threshold_db = speech_threshold_db(energy, margin_db)
+    is_speech = energy > threshold_db
+
+    # Collect runs of speech frames as [start_frame, end_frame)
+    edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    min_gap = int(round(min_silence_seconds / FRAME_SECONDS))
+    min_len = int(round(min_speech_seconds / FRAME_SECONDS))
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    frame_samples = int(FRAME_SECONDS * sample_rate)
+    padding = int(padding_seconds * sample_rate)
+    speech = []
+    for start, end in regions:
+        if end - start < min_len:
+            continue
+        start_sample = max(0, int(start) * frame_samples - padding)
+        end_sample = min(len(audio), int(end) * frame_samples + padding)
+        if speech and start_sample <= speech[-1][1]:
+            speech[-1] = (speech[-1][0], end_sample)
+        else:
+            speech.append((start_sample, end_sample))
+    return speech
+
+def _quietest_cut(audio, start, end, sample_rate):
+    """Return the sample index of the quietest frame in audio[start:end]"""
+    energy = frame_energy_db(audio[start:end], sample_rate)
+    if len(energy) == 0:
+        return end
+    return start + int(np.argmin(energy)) * int(FRAME_SECONDS * sample_rate)
+
+def vad_chunks(audio, target_seconds, sample_rate=SAMPLE_RATE, max_merge_gap_seconds=2.0, regions=None, **vad_options):
+    """
+    Split a decoded buffer into speech-only chunks of roughly target_seconds.
+
+    Neighbouring speech regions are merged while the gap between them is at
+    most max_merge_gap_seconds and the chunk stays within target_seconds;
+    longer silences are dropped entirely. Regions longer than the target are
+    cut at the quietest frame in the last fifth of each window.
+
+    Args:
+        regions: Sorted (start_sample, end_sample) spans to chunk instead of the
+            detected speech, e.g. the turns of selected speakers
+
+    Returns:
+        List of (start_seconds, samples) tuples, where samples is a view into audio
+    """
+    target = int(target_seconds * sample_rate)
+    max_gap = int(max_merge_gap_seconds * sample_rate)
+    if regions is None:
+        regions = detect_speech_regions(audio, sample_rate, **vad_options)
+
+    spans = []
+    for start, end in regions:
+        while end - start > target:
+            cut = _quietest_cut(audio, start + target * 4 // 5, start + target, sample_rate)
+            spans.append((start, cut))
+            start = cut
+        spans.append((start, end))
+
+    chunks = []
+    for start, end in spans:
+        if chunks and start - chunks[-1][1] <= max_gap and end - chunks[-1][0] <= target:
+            chunks[-1] = (chunks[-1][0], end)
+        else:
+            chunks.append((start, end))
+    return [(start / sample_rate, audio[start:end]) for start, end in chunks]
+
+def speech_ratio(chunks, audio, sample_rate=SAMPLE_RATE):
+    """Return the fraction of the recording that is kept for transcription"""
+    if len(audio) == 0:
+        return 0.0
+    return sum(len(samples) for _, samples in chunks) / len(audio)
@@ -15,7 +15,9 @@ warnings.filterwarnings("ignore", message="torchaudio._backend.set_audio_backend
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-from main import transcribe_and_diarize, read_competency_definitions, extract_competency_insights, generate_combined_report, generate_structured_json
+from main import transcribe_and_diarize, read_competency_definitions, extract_speaker_insights, generate_combined_report, generate_structured_json
+from models import model_stats, format_model_stats
+from llm_client import reset_retry_budget
 from colorama import Fore, Style
 import threading
 from pygame import mixer
@@ -455,6 +457,7 @@ class AudioReflectionPage(ttk.Frame):
         music_playing = False
         try:
             self.log_progress("Starting batch analysis...")
+            reset_retry_budget()
             self.log_progress("Note: Using local Whisper model for transcription")
             
             # Start background music if enabled
@@ -492,17 +495,10 @@ class AudioReflectionPage(ttk.Frame):
 
                 # Extract insights
                 self.log_progress(f"Extracting competency insights for {file_name}...")
-                competency_data = {}
-                
-                if len(speaker_transcripts) == 1 and "Speaker 1" in speaker_transcripts:
-                    speaker = "Single Speaker"
-                    transcript = speaker_transcripts["Speaker 1"]
-                    self.log_progress(f"Analyzing {speaker}...")
-                    competency_data[speaker] = extract_competency_insights(transcript, competency_definitions)
-                else:
-                    for speaker, transcript in speaker_transcripts.items():
-                        self.log_progress(f"Analyzing {speaker}...")
-                        competency_data[speaker] = extract_competency_insights(transcript, competency_definitions)
+                competency_data = extract_speaker_insights(
+                    speaker_transcripts, competency_definitions,
+                    on_start=lambda speaker: self.log_progress(f"Analyzing {speaker}...")
+                )
 
                 # Create results directory if it doesn't exist
                 os.makedirs('results', exist_ok=True)
@@ -540,6 +536,10 @@ class AudioReflectionPage(ttk.Frame):
                 # Add this file's reports to the overall list
                 all_reports.extend(file_reports)
 
+            # Report on the shared Whisper models used across the batch
+            for stats in model_stats():
+                self.log_progress(format_model_stats(stats))
+
             # Stop background music if it was playing
             if music_playing:
                 stop_background_music()
@@ -813,6 +813,7 @@ class PortfolioPage(ttk.Frame):
         music_playing = False
         try:
             self.log_progress("Starting portfolio analysis...")
+            reset_retry_budget()
             
             # Start background music if enabled
             if self.play_music.get():
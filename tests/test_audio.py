@@ -0,0 +1,42 @@
+# Tests for the ffmpeg decoding in src/audio.py, run against a fake ffmpeg
+
+import sys
+import threading
+import numpy as np
+import pytest
+import audio
+
+# Writes `noise` bytes of warnings to stderr before any audio, like ffmpeg on a damaged file
+FAKE_FFMPEG = """
+import sys
+import numpy as np
+sys.stderr.write("x" * {noise})
+sys.stderr.flush()
+sys.stdout.buffer.write((np.arange({samples}) % 100).astype(np.int16).tobytes())
+sys.exit({exit_code})
+"""
+
+def fake_ffmpeg(monkeypatch, noise=0, samples=16000, exit_code=0):
+    script = FAKE_FFMPEG.format(noise=noise, samples=samples, exit_code=exit_code)
+    monkeypatch.setattr(audio, "_ffmpeg_command", lambda file_path, sample_rate: [sys.executable, "-c", script])
+    monkeypatch.setattr(audio, "probe_duration", lambda file_path: None)
+
+def test_load_audio_survives_lots_of_stderr(monkeypatch):
+    # Far more than a pipe buffer; with stderr on a pipe ffmpeg and the reader deadlock
+    fake_ffmpeg(monkeypatch, noise=1024 * 1024, samples=48000)
+    result = {}
+    reader = threading.Thread(target=lambda: result.update(audio=audio.load_audio("damaged.m4a")), daemon=True)
+    reader.start()
+    reader.join(timeout=30)
+    assert not reader.is_alive(), "load_audio hung on ffmpeg's stderr"
+    assert len(result["audio"]) == 48000
+    np.testing.assert_allclose(result["audio"][:5], np.arange(5) / 32768.0)
+
+def test_stream_audio_reports_ffmpeg_errors(monkeypatch):
+    fake_ffmpeg(monkeypatch, noise=200 * 1024, samples=100, exit_code=1)
+    with pytest.raises(RuntimeError, match="Failed to decode audio broken.mp3: x+"):
+        list(audio.stream_audio("broken.mp3"))
+
+def test_stream_fingerprint_matches_load_audio(monkeypatch):
+    fake_ffmpeg(monkeypatch, noise=100 * 1024, samples=16000 * 70)
+    assert audio.stream_fingerprint("talk.mp3") == audio.audio_fingerprint(audio.load_audio("talk.mp3"))
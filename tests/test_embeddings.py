@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from embeddings import chunk_turn_embeddings
+
+
+def test_turns_take_embedding_of_most_active_local_speaker():
+    # Two 10 s chunks, 5 s apart, 10 frames each (1 s per frame), two local speakers
+    data = np.zeros((2, 10, 2))
+    data[0, 0:6, 0] = 1   # chunk 0: speaker A over 0-6 s
+    data[0, 6:10, 1] = 1  # chunk 0: speaker B over 6-10 s
+    data[1, 0:1, 1] = 1   # chunk 1: speaker B over 5-6 s
+    data[1, 1:10, 0] = 1  # chunk 1: speaker A over 6-15 s, local labels swapped
+    segmentations = SimpleNamespace(
+        data=data, sliding_window=SimpleNamespace(start=0.0, duration=10.0, step=5.0))
+    embeddings = np.array([
+        [[1.0, 0.0], [0.0, 1.0]],
+        [[0.0, 2.0], [np.nan, np.nan]],  # chunk 1's speaker B has no usable embedding
+    ])
+    turns = [(0.0, 6.0, "SPEAKER_00"), (6.0, 10.0, "SPEAKER_01"), (10.0, 10.2, "SPEAKER_00")]
+
+    result = chunk_turn_embeddings(turns, segmentations, embeddings)
+
+    assert result.shape == (3, 2)
+    assert result.dtype == np.float32
+    # Turn 0: A in chunk 0; in chunk 1 only the speaker without an embedding is active
+    np.testing.assert_allclose(result[0], [1.0, 0.0])
+    # Turn 1: B in chunk 0 and A in chunk 1, both unit length after normalizing
+    np.testing.assert_allclose(result[1], [0.0, 1.0])
+    # Too short to embed
+    assert np.isnan(result[2]).all()
@@ -0,0 +1,32 @@
+# Tests for the JAM command-line batch logic in src/jam.py
+
+import argparse
+import pytest
+
+# jam imports the whole analysis stack (Whisper, pyannote, plotting)
+jam = pytest.importorskip("jam")
+
+def jam_args(**overrides):
+    args = dict(batch_size=8, max_memory_mb=0, diarization=True, diarize_first=False, daemon=False)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+def test_batch_pretranscription_runs_for_several_files():
+    assert jam.batch_pretranscription(jam_args(), ["a.mp3", "b.mp3"])
+
+def test_batch_pretranscription_is_skipped_with_diarize_first():
+    assert not jam.batch_pretranscription(jam_args(diarize_first=True), ["a.mp3", "b.mp3"])
+    # Without diarization, diarize-first does nothing and whole recordings are transcribed
+    assert jam.batch_pretranscription(jam_args(diarization=False, diarize_first=True), ["a.mp3", "b.mp3"])
+
+def test_process_audio_skips_the_pre_pass_with_diarize_first(monkeypatch, tmp_path):
+    files = [tmp_path / "a.mp3", tmp_path / "b.mp3"]
+    for audio_file in files:
+        audio_file.write_bytes(b"")
+    calls = []
+    monkeypatch.setattr(jam, "pretranscribe_batch", lambda *args, **kwargs: calls.append(args))
+    monkeypatch.setattr(jam, "read_competency_definitions", lambda path: "definitions")
+    monkeypatch.setattr(jam, "transcribe_file", lambda audio_file, args: None)
+    args = jam_args(diarize_first=True, input=[str(f) for f in files], competency=None, output="json")
+    jam.process_audio(args)
+    assert calls == []
@@ -0,0 +1,75 @@
+# Tests for response caching and retries in src/llm_client.py, against a local fake provider
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import cache
+import llm_client
+
+MESSAGES = [{"role": "user", "content": "Rate this transcript"}]
+
+def completion(content):
+    return {"choices": [{"message": {"content": content}}]}
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    """Serve the queued response bodies in order (the last one repeats) and count requests"""
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(llm_client, "backoff_seconds", lambda attempt, retry_after=None: 0)
+    monkeypatch.setattr(llm_client, "_breaker", llm_client.CircuitBreaker(0, 0))
+    monkeypatch.setattr(llm_client, "_budget", llm_client.RetryBudget(100))
+    state = {"bodies": [], "requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = state["bodies"][min(state["requests"], len(state["bodies"]) - 1)]
+            state["requests"] += 1
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}/"
+    yield state
+    server.shutdown()
+
+def test_error_body_is_retried_and_never_cached(provider):
+    provider["bodies"] = [{"error": {"code": 502, "message": "upstream unavailable"}}, completion('{"ok": true}')]
+    assert llm_client.chat_completion(MESSAGES, url=provider["url"]) == completion('{"ok": true}')
+    assert provider["requests"] == 2
+    # The good reply was cached; the error body was not
+    assert llm_client.chat_completion(MESSAGES, url=provider["url"], cache_only=True) == completion('{"ok": true}')
+
+def test_non_retryable_error_body_raises(provider):
+    provider["bodies"] = [{"error": {"code": 400, "message": "bad request"}}]
+    with pytest.raises(llm_client.ProviderError, match="bad request"):
+        llm_client.chat_completion(MESSAGES, url=provider["url"])
+    assert provider["requests"] == 1
+    with pytest.raises(llm_client.CacheMiss):
+        llm_client.chat_completion(MESSAGES, url=provider["url"], cache_only=True)
+
+def test_reply_that_fails_validation_is_returned_but_not_cached(provider):
+    provider["bodies"] = [completion("Sorry, I cannot answer in JSON"), completion('{"ok": true}')]
+    first = llm_client.chat_completion(MESSAGES, url=provider["url"], validate=json.loads)
+    assert first == completion("Sorry, I cannot answer in JSON")
+    second = llm_client.chat_completion(MESSAGES, url=provider["url"], validate=json.loads)
+    assert second == completion('{"ok": true}')
+    assert provider["requests"] == 2
+    assert llm_client.chat_completion(MESSAGES, url=provider["url"], validate=json.loads, cache_only=True) == second
+
+def test_previously_cached_bad_reply_is_not_replayed(provider):
+    provider["bodies"] = [completion('{"ok": true}')]
+    key = cache.make_key("chat_completion", provider["url"], {"model": llm_client.OPENROUTER_MODEL, "messages": MESSAGES})
+    cache.cache_put(llm_client.LLM_CACHE_NAMESPACE, key, {"created": time.time(), "response": {"error": {"code": 429}}})
+    assert llm_client.chat_completion(MESSAGES, url=provider["url"]) == completion('{"ok": true}')
+    assert provider["requests"] == 1